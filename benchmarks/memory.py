@@ -0,0 +1,47 @@
+#!/usr/bin/python3
+"""
+Peak RSS of the orchestrator's in memory representation for large inventories.
+
+Hosts are parsed while being iterated (as when orchestrating) and one result per
+host is kept (host, action and raw output), without running any command.
+
+usage: benchmarks/memory.py [hosts]
+"""
+import os
+import sys
+import resource
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from usorchestrator.remote import Remote
+from usorchestrator.action import Action
+from usorchestrator.action_exec import ActionExec
+from usorchestrator.action_output import ActionOutput
+
+OUTPUT = b'upgrade: 12 upgraded, 0 newly installed, 0 to remove and 0 not upgraded.\ndist-upgrade: 0 upgraded, 0 newly installed, 0 to remove and 0 not upgraded.'
+
+def peak_rss() -> int:
+    # kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def main():
+    hosts_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    baseline = peak_rss()
+
+    action = Action('routine', 'update')
+    raw_hosts = (f'root@host{i}.dc1.example.com:22' for i in range(hosts_count))
+    results = []
+
+    for host in map(Remote, raw_hosts):
+        action_exec = ActionExec(stdout=[OUTPUT + host.host.encode('utf-8')], stderr=[b''], return_code=0)
+        results.append((ActionOutput(action, host), action_exec))
+
+    used = peak_rss() - baseline
+
+    print(f'hosts: {hosts_count}')
+    print(f'peak rss: {peak_rss() / 1024:.1f} MiB (baseline {baseline / 1024:.1f} MiB)')
+    print(f'per 10k hosts: {used / hosts_count * 10000 / 1024:.2f} MiB')
+
+if __name__ == '__main__':
+    main()
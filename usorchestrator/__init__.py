@@ -10,6 +10,7 @@ def main():
 
    parser.add_argument('--log', dest='log_file', help='Log file', default=None)
    parser.add_argument('--log-level', dest='log_level', help='Log level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'])
+   parser.add_argument('--history-db', dest='history_db', help='Results history database', default=None)
    parser.add_argument('--version', action='version', version=f'{__app_name__} {__version__}')
 
    subparsers = parser.add_subparsers(title="Commands", dest="command")
@@ -23,8 +24,30 @@ def main():
    orchestrate_parser.add_argument('--command', dest='commands', help='Command to be executed on target hosts', action='append')
    orchestrate_parser.add_argument('--routine', dest='routines', help='Routine to be executed on target hosts', action='append')
    orchestrate_parser.add_argument('--transfer', dest='transfers', help='Transfer to be executed on target hosts (<local-path>:<remote-path>)', action='append')
-   orchestrate_parser.add_argument('--data', dest='data', help='Data to be passed to the given routine (key=value)', action='append')
+   orchestrate_parser.add_argument('--transfer-compress', dest='transfer_compress', help='Compress transfers sources before sending them to the hosts', action='store_true')
+   orchestrate_parser.add_argument('--data', dest='data', help='Data to be passed to the given routine (key=value, key=@file or key=@- for stdin, key=@@value for a literal "@")', action='append')
    orchestrate_parser.add_argument('--filter', dest='filters', help='Filter hosts output', action='append', choices=['exec_ok', 'exec_failed', 'condition_ok', 'condition_failed'])
+   orchestrate_parser.add_argument('--profile', dest='profile', help='Profile the orchestrator process', choices=['cpu', 'mem'])
+   orchestrate_parser.add_argument('--profile-output', dest='profile_output', help='Profile report file', default=None)
+   orchestrate_parser.add_argument('--profile-on-demand', dest='profile_on_demand', help='Collect profile only while toggled on with SIGUSR1', action='store_true')
+   orchestrate_parser.add_argument('--summary', dest='summary', help='Show only per host results counters instead of the actions output', action='store_true')
+   orchestrate_parser.add_argument('--watch', dest='watch', help='Run actions periodically at the given interval (ex: 30s, 5m), showing only changed results')
+   orchestrate_parser.add_argument('--watch-jitter', dest='watch_jitter', help='Spread hosts executions randomly over the given time in watch mode (default 10%% of the interval)')
+   orchestrate_parser.add_argument('--no-history', dest='history', help='Don\'t save results to history', action='store_false')
+   orchestrate_parser.add_argument('--concurrency', dest='concurrency', help='Number of hosts to orchestrate in parallel', type=int, default=1)
+   orchestrate_parser.add_argument('--body-concurrency', dest='body_concurrency', help='Evaluate routines conditions on all hosts first, then execute the routines on the hosts that passed them with the given concurrency (routines without a condition are entirely executed with it)', type=int)
+
+   history_parser = subparsers.add_parser('history', help='Query results history')
+   history_group = history_parser.add_mutually_exclusive_group()
+   history_group.add_argument('--run', dest='run', help='Show results of the given run', type=int)
+   history_group.add_argument('--diff', dest='diff', help='Show results changed between 2 runs', type=int, nargs=2, metavar=('RUN_A', 'RUN_B'))
+   history_group.add_argument('--diff-since', dest='diff_since', help='Show results changed since the given time ago (ex: 30m, 12h, 1d)')
+   history_parser.add_argument('--host', dest='hosts', help='Filter by host', action='append')
+   history_parser.add_argument('--action', dest='actions', help='Filter by action name (routine, command or transfer)', action='append')
+   history_parser.add_argument('--limit', dest='limit', help='Number of runs to list', type=int, default=20)
+
+   # internal command, used by the orchestrator to delegate hosts to relays
+   subparsers.add_parser('worker')
 
    args = parser.parse_args()
 
@@ -36,6 +59,7 @@ def main():
       usorchestrator = UsOrchestratorManager({
          'log_file': args.log_file,
          'log_level': args.log_level,
+         'history_db': args.history_db,
       })
    except UsOrchestratorConfigError as e:
       print(f"Config error: {e}\nCheck documentation for more information on how to configure UsOrchestrator")
@@ -43,6 +67,17 @@ def main():
 
    if args.command == 'show':
       usorchestrator.show(args.type)
+   elif args.command == 'history':
+      usorchestrator.history({
+         'run': args.run,
+         'diff': args.diff,
+         'diff_since': args.diff_since,
+         'hosts': args.hosts,
+         'actions': args.actions,
+         'limit': args.limit,
+      })
+   elif args.command == 'worker':
+      usorchestrator.worker()
    elif args.command == 'orchestrate':
       usorchestrator.orchestrate({
          'hosts': args.hosts,
@@ -52,4 +87,14 @@ def main():
          'transfers': args.transfers,
          'data': args.data,
          'filters': args.filters,
+         'concurrency': args.concurrency,
+         'body_concurrency': args.body_concurrency,
+         'transfer_compress': args.transfer_compress,
+         'profile': args.profile,
+         'profile_output': args.profile_output,
+         'profile_on_demand': args.profile_on_demand,
+         'history': args.history,
+         'summary': args.summary,
+         'watch': args.watch,
+         'watch_jitter': args.watch_jitter,
       })
\ No newline at end of file
@@ -1,17 +1,24 @@
+import sys
 import uuid
 import shlex
 import re
 from usorchestrator.remote import Remote
 from usorchestrator.action_transfer import ActionTransfer
 from usorchestrator.action_exec import ActionExec
-from usorchestrator.remote_cmd import remote_cmd
+from usorchestrator.remote_cmd import remote_cmd, OUTPUT_CAPTURE, OUTPUT_SPOOL, OUTPUT_DISCARD
+from usorchestrator.spooled_output import read_output
+from usorchestrator.remote_script import RemoteScript, SCRIPT_CACHE_THRESHOLD
+from usorchestrator.remote_data import RemoteData
+from usorchestrator.resource_limits import ResourceLimits, ResourceLimit, acquire_limits
 from usorchestrator.exceptions import ActionError
 
 class Action:
+    __slots__ = ('_id', '_type', '_name', '_splice_localhost', '_exec_mode', '_commands', '_condition', '_actions', '_transfers', '_data_definition', '_requirements', '_limits')
+
     def __init__(self, action_type:str, action_name:str, **data) -> None:
-        self.id: str = uuid.uuid4().hex[:12]
+        self._id: str = None
 
-        self._type: str = action_type
+        self._type: str = sys.intern(action_type)
         self._name: str = action_name
 
         self._splice_localhost: bool = data.get('splice_localhost', False)
@@ -22,6 +29,7 @@ class Action:
         self._transfers: list[ActionTransfer] = []
         self._data_definition: dict = {}
         self._requirements: list = []
+        self._limits: list[ResourceLimit] = []
 
         command = data.get('command')
         action = data.get('action')
@@ -31,6 +39,14 @@ class Action:
         if action and type(action) == Action: self.addAction(action)
         if transfer and type(transfer) == ActionTransfer: self.addTransfer(transfer)
 
+    # generated on first access only
+    @property
+    def id(self) -> str:
+        if self._id is None:
+            self._id = uuid.uuid4().hex[:12]
+
+        return self._id
+
     @property
     def type(self) -> str:
         return self._type
@@ -63,6 +79,10 @@ class Action:
     def transfers(self) -> list['ActionTransfer']:
         return self._transfers
 
+    @property
+    def limits(self) -> list[ResourceLimit]:
+        return self._limits
+
     def setSpliceLocalhost(self, splice_localhost:bool) -> None:
         self._splice_localhost = splice_localhost
 
@@ -87,6 +107,9 @@ class Action:
     def setRequirements(self, requirements: list) -> None:
         self._requirements = requirements
 
+    def setLimits(self, limits: list[ResourceLimit]) -> None:
+        self._limits = limits
+
     def getActionsNames(self) -> list:
         return [action.name for action in self._actions]
 
@@ -96,58 +119,112 @@ class Action:
 
         return ''
 
-    def runAction(self, host: Remote, data: dict = None) -> ActionExec:
+    def hasTransfers(self) -> bool:
+        if any(self._transfers):
+            return True
+
+        if self._condition and self._condition.hasTransfers():
+            return True
+
+        return any(action.hasTransfers() for action in self._actions if action)
+
+    # compiled representation of the action, used to delegate it to relay workers
+    def toDict(self) -> dict:
+        return {
+            'type': self._type,
+            'name': self._name,
+            'splice_localhost': self._splice_localhost,
+            'exec_mode': self._exec_mode,
+            'commands': self._commands,
+            'condition': self._condition.toDict() if self._condition else None,
+            'actions': [action.toDict() for action in self._actions if action],
+            'data_definition': self._data_definition,
+            'requirements': self._requirements,
+            'limits': [spec for limit in self._limits for spec in limit.specs],
+        }
+
+    @staticmethod
+    def fromDict(data: dict, resource_limits: ResourceLimits) -> 'Action':
+        action = Action(data['type'], data['name'], splice_localhost=data['splice_localhost'], exec_mode=data['exec_mode'])
+
+        for command in data['commands']:
+            action.addCommand(command)
+
+        for sub_action in data['actions']:
+            action.addAction(Action.fromDict(sub_action, resource_limits))
+
+        if data['condition']:
+            action.setCondition(Action.fromDict(data['condition'], resource_limits))
+
+        action.setDataDefinition(data['data_definition'])
+        action.setRequirements(data['requirements'])
+        action.setLimits(resource_limits.define(data['limits']))
+
+        return action
+
+    def runAction(self, host: Remote, data: dict = None, output_mode: str = OUTPUT_CAPTURE) -> ActionExec:
         # agregator action
         if self._condition:
-            condition_runned_action = self._condition.runAction(host, data)
+            condition_runned_action = self.runCondition(host, data, output_mode)
 
-            if not condition_runned_action.passed_condition or condition_runned_action.return_code != 0:
-                condition_runned_action.update(passed_condition=False)
+            if not condition_runned_action.passed_condition:
                 return condition_runned_action
 
+        return self.runBody(host, data, output_mode)
+
+    def runCondition(self, host: Remote, data: dict = None, output_mode: str = OUTPUT_CAPTURE) -> ActionExec:
+        if not self._condition:
+            return ActionExec(return_code=0)
+
+        condition_runned_action = self._condition.runAction(host, data, output_mode)
+
+        if not condition_runned_action.passed_condition or condition_runned_action.return_code != 0:
+            condition_runned_action.update(passed_condition=False)
+
+        return condition_runned_action
+
+    # action without its condition
+    def runBody(self, host: Remote, data: dict = None, output_mode: str = OUTPUT_CAPTURE) -> ActionExec:
         stdout: list = []
         stderr: list = []
 
-        # end leaf action
-        if self._commands:
-            for cmd in self._commands:
-                if not cmd:
-                    continue
+        # end leaf actions, executed while holding the routine's resource limits
+        with acquire_limits(self._limits):
+            # end leaf action
+            if self._commands:
+                for cmd in self._commands:
+                    if not cmd:
+                        continue
 
-                cmd_variables = self._gen_cmd_variables(host, data)
-                cmd_to_exec = self._gen_cmd(cmd_variables, cmd)
+                    cmd_variables = self._gen_cmd_variables(host, data)
+                    output = self._exec_cmd(host, cmd_variables, cmd, output_mode)
 
-                if self._exec_mode == 'local':
-                    output = remote_cmd('ssh-bash', (cmd_to_exec,), True)
-                elif self._exec_mode == 'remote':
-                    output = remote_cmd('ssh-bash', (cmd_to_exec,), host.local, host.host, host.user, host.port, host.password)
-                else:
-                    raise ActionError(f'Unknown exec mode "{self._exec_mode}"')
+                    stdout.append(output['stdout'])
+                    stderr.append(output['stderr'])
 
-                stdout.append(output['stdout'])
-                stderr.append(output['stderr'])
+                    if output['return_code'] != 0:
+                        return ActionExec(stdout=stdout, stderr=stderr, return_code=output['return_code'])
 
-                if output['return_code'] != 0:
-                    return ActionExec(stdout=stdout, stderr=stderr, return_code=output['return_code'])
-
-        # end leaf action
-        if self._transfers:
-            for transfer in self._transfers:
-                if not transfer:
-                    continue
+            # end leaf action
+            if self._transfers:
+                for transfer in self._transfers:
+                    if not transfer:
+                        continue
                 
-                output = remote_cmd('scp', (transfer.src, transfer.dst), host.local, host.host, host.user, host.port, host.password)
-                # output overwrites
-                if output['return_code'] == 0:
-                    output['stdout'] = 'Transfer completed' + (':\n' + output['stdout'] if output['stdout'] else '')
-                else:
-                    output['stderr'] = 'Transfer failed' + (':\n' + output['stderr'] if output['stderr'] else '')
+                    output = self._transfer(host, transfer, output_mode)
+                    # output overwrites (transfers output is small, it's read right away)
+                    if output['return_code'] == 0:
+                        output_stdout = read_output(output['stdout'])
+                        output['stdout'] = b'Transfer completed' + (b':\n' + output_stdout if output_stdout else b'')
+                    else:
+                        output_stderr = read_output(output['stderr'])
+                        output['stderr'] = b'Transfer failed' + (b':\n' + output_stderr if output_stderr else b'')
 
-                stdout.append(output['stdout'])
-                stderr.append(output['stderr'])
+                    stdout.append(output['stdout'])
+                    stderr.append(output['stderr'])
 
-                if output['return_code'] != 0:
-                    return ActionExec(stdout=stdout, stderr=stderr, return_code=output['return_code'])
+                    if output['return_code'] != 0:
+                        return ActionExec(stdout=stdout, stderr=stderr, return_code=output['return_code'])
 
         # agregator action
         if self._actions:
@@ -155,13 +232,14 @@ class Action:
                 if not action:
                     continue
 
-                runned_action = action.runAction(host, data)
+                runned_action = action.runAction(host, data, output_mode)
 
                 if not runned_action.passed_condition or runned_action.return_code != 0:
                     return runned_action
                 
-                stdout += runned_action.stdout
-                stderr += runned_action.stderr
+                # merged without reading spooled outputs
+                stdout += runned_action.stdout_parts
+                stderr += runned_action.stderr_parts
 
         return ActionExec(stdout=stdout, stderr=stderr, return_code=0)
     
@@ -187,17 +265,59 @@ class Action:
 
         return cmd_variables
 
-    def _gen_cmd(self, variables: dict, cmd: str) -> str:
+    def _exec_cmd(self, host: Remote, variables: dict, cmd: str, output_mode: str = OUTPUT_CAPTURE) -> dict:
+        (preamble, data_input) = self._gen_cmd_preamble(variables)
+        script = self._gen_cmd_script(cmd)
+
+        # small scripts are sent inline with every command
+        if len(script) < SCRIPT_CACHE_THRESHOLD:
+            return self._remote_cmd(host, 'ssh-bash', ('\n'.join([preamble, script]),), input=data_input, output_mode=output_mode)
+
+        # large scripts are executed from the host's script cache, uploaded on the first miss
+        # (cache misses are reported on stderr, which can't be discarded)
+        remote_script = RemoteScript(script)
+        exec_output_mode = OUTPUT_SPOOL if output_mode == OUTPUT_DISCARD else output_mode
+        output = self._remote_cmd(host, 'ssh-bash', (remote_script.gen_exec(preamble),), input=data_input, output_mode=exec_output_mode)
+
+        if not remote_script.is_cache_miss(output):
+            return output
+
+        upload_output = self._remote_cmd(host, 'ssh-bash', (remote_script.gen_upload(),), input=script.encode('utf-8'))
+
+        if upload_output['return_code'] != 0:
+            upload_output['stderr'] = b'Script upload failed' + (b':\n' + upload_output['stderr'] if upload_output['stderr'] else b'')
+            return upload_output
+
+        return self._remote_cmd(host, 'ssh-bash', (remote_script.gen_exec(preamble),), input=data_input, output_mode=exec_output_mode)
+
+    def _transfer(self, host: Remote, transfer: ActionTransfer, output_mode: str = OUTPUT_CAPTURE) -> dict:
+        if not transfer.artifact_cache or host.local:
+            return remote_cmd('scp', (transfer.src, transfer.dst), host.local, host.host, host.user, host.port, host.password, output_mode=output_mode)
+
+        # source is prepared once for all hosts, its archive being streamed to each host
+        try:
+            artifact = transfer.artifact_cache.prepare(transfer.src)
+        except OSError as e:
+            return {'stdout': b'', 'stderr': str(e).encode('utf-8'), 'return_code': 1}
+
+        with open(artifact.path, 'rb') as f:
+            return remote_cmd('ssh-bash', (artifact.gen_extract(transfer.dst),), host.local, host.host, host.user, host.port, host.password, input=f, output_mode=output_mode)
+
+    def _remote_cmd(self, host: Remote, protocol: str, action: tuple[str], input: bytes = None, output_mode: str = OUTPUT_CAPTURE) -> dict:
+        if self._exec_mode == 'local':
+            return remote_cmd(protocol, action, True, input=input, output_mode=output_mode)
+        elif self._exec_mode == 'remote':
+            return remote_cmd(protocol, action, host.local, host.host, host.user, host.port, host.password, input=input, output_mode=output_mode)
+        else:
+            raise ActionError(f'Unknown exec mode "{self._exec_mode}"')
+
+    # per call part of the command (shell options and variables) and the streamed variables values
+    def _gen_cmd_preamble(self, variables: dict) -> tuple[str, bytes]:
         cmd_parts = []
+        remote_data = RemoteData()
 
         cmd_parts.append('set -e')
 
-        # add check for required programs
-        if self._requirements:
-            for requirement in self._requirements:
-                require_safe = shlex.quote(requirement)
-                cmd_parts.append(f'command -v {require_safe} > /dev/null 2>&1 || {{ echo >&2 "Required command \\"{require_safe}\\" not found"; exit 999; }}')
-
         # add variables
         if variables:
             for (name, value) in variables.items():
@@ -205,7 +325,12 @@ class Action:
                     raise ActionError(f'Variable "{name}" is not a valid bash variable name')
                 
                 value = str(value)
-                
+
+                # large values are streamed over stdin instead of the command line
+                if remote_data.accepts(value):
+                    remote_data.add(name, value)
+                    continue
+
                 safe_value = shlex.quote(value)
 
                 # make sure that value is quoted
@@ -214,6 +339,21 @@ class Action:
 
                 cmd_parts.append(f'{name}={safe_value}')
 
+        if remote_data.names:
+            cmd_parts.append(remote_data.gen_read())
+
+        return ('\n'.join(cmd_parts), remote_data.input)
+
+    # static part of the command (requirements check and command body)
+    def _gen_cmd_script(self, cmd: str) -> str:
+        cmd_parts = []
+
+        # add check for required programs
+        if self._requirements:
+            for requirement in self._requirements:
+                require_safe = shlex.quote(requirement)
+                cmd_parts.append(f'command -v {require_safe} > /dev/null 2>&1 || {{ echo >&2 "Required command \\"{require_safe}\\" not found"; exit 999; }}')
+
         # add command
         cmd_parts.append(cmd)
 
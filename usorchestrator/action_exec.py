@@ -1,16 +1,43 @@
+from usorchestrator.spooled_output import SpooledOutput, read_output
+
 class ActionExec:
+    # output is kept as raw bytes (or spooled to temporary files) and only read and decoded when accessed
+    __slots__ = ('_stdout', '_stderr', '_return_code', '_passed_condition', '_started_at', '_duration', '_output_discarded')
+
     def __init__(self, **data) -> None:
-        self._stdout: list = data.get('stdout', [])
-        self._stderr: list = data.get('stderr', [])
+        self._stdout: list[bytes] = data.get('stdout', [])
+        self._stderr: list[bytes] = data.get('stderr', [])
         self._return_code: int = data.get('return_code', 0)
         self._passed_condition: bool = data.get('passed_condition', True)
+        self._started_at: float = data.get('started_at', None)
+        self._duration: float = data.get('duration', None)
+        self._output_discarded: bool = data.get('output_discarded', False)
     
     @property
-    def stdout(self) -> list:
-        return self._stdout
+    def stdout(self) -> list[str]:
+        return [output.decode('utf-8', errors='replace') for output in self.raw_stdout]
     
     @property
-    def stderr(self) -> list:
+    def stderr(self) -> list[str]:
+        return [output.decode('utf-8', errors='replace') for output in self.raw_stderr]
+
+    @property
+    def raw_stdout(self) -> list[bytes]:
+        self._stdout = [read_output(output) for output in self._stdout]
+        return self._stdout
+
+    @property
+    def raw_stderr(self) -> list[bytes]:
+        self._stderr = [read_output(output) for output in self._stderr]
+        return self._stderr
+
+    # outputs as stored, possibly not read yet
+    @property
+    def stdout_parts(self) -> list:
+        return self._stdout
+
+    @property
+    def stderr_parts(self) -> list:
         return self._stderr
     
     @property
@@ -20,9 +47,36 @@ class ActionExec:
     @property
     def passed_condition(self) -> bool:
         return self._passed_condition
+
+    # execution start timestamp
+    @property
+    def started_at(self) -> float:
+        return self._started_at
+
+    # execution duration in seconds
+    @property
+    def duration(self) -> float:
+        return self._duration
+
+    # output was dropped without being read (ex: result not matching the filters)
+    @property
+    def output_discarded(self) -> bool:
+        return self._output_discarded
     
+    # drop the outputs, spooled outputs being closed without being read
+    def discard_output(self) -> None:
+        for output in self._stdout + self._stderr:
+            if isinstance(output, SpooledOutput):
+                output.close()
+
+        self._stdout = []
+        self._stderr = []
+        self._output_discarded = True
+
     def update(self, **data) -> None:
         self._stdout = data.get('stdout', self._stdout)
         self._stderr = data.get('stderr', self._stderr)
         self._return_code = data.get('return_code', self._return_code)
-        self._passed_condition = data.get('passed_condition', self._passed_condition)
\ No newline at end of file
+        self._passed_condition = data.get('passed_condition', self._passed_condition)
+        self._started_at = data.get('started_at', self._started_at)
+        self._duration = data.get('duration', self._duration)
\ No newline at end of file
@@ -4,19 +4,24 @@ from usorchestrator.action_exec import ActionExec
 from usorchestrator.remote import Remote
 
 class ActionOutput:
+    __slots__ = ('_action', '_host')
+
     def __init__(self, action: Action, host: Remote) -> None:
         self._action: Action = action
         self._host: Remote = host
 
-        self._header_str: str = f'"{self._action.name}" {self._action.type} for "{self._host.host}"'
-
-    def print_temp_info(self):
-        sys.stdout.write((f'● Running {self._header_str} ...\r'))
+    @property
+    def action(self) -> Action:
+        return self._action
 
-    def reset_temp_info(self):
-        sys.stdout.write('\033[K')
+    @property
+    def host(self) -> Remote:
+        return self._host
 
     def print_info(self, action_exec: ActionExec):
+        sys.stdout.write(self.format_info(action_exec))
+
+    def format_info(self, action_exec: ActionExec) -> str:
         # colorize header marker
         if action_exec.return_code == 0:
             header_marker = '\033[0;32m' + '●' + '\033[0m'
@@ -26,7 +31,7 @@ class ActionOutput:
             else:
                 header_marker = '\033[0;31m' + '●' + '\033[0m'
         
-        header = self._header_str
+        header = f'"{self._action.name}" {self._action.type} for "{self._host.host}"'
         (stdout, stderr) = self._get_action_output(action_exec)
 
         header_marker_len = 2
@@ -55,8 +60,8 @@ class ActionOutput:
             output_print += f'|\033[0;31m{line.ljust(length)}\033[0m|\n'
 
         output_print += '+' + '-' * length + '+\n'
-        
-        sys.stdout.write(output_print)
+
+        return output_print
 
     def _get_action_output(self, action_exec: ActionExec) -> tuple:
         # filter empty lines
@@ -1,9 +1,13 @@
 import re
+from usorchestrator.artifacts import ArtifactCache
 
 class ActionTransfer:
-    def __init__(self, transfer: str) -> None:
+    __slots__ = ('_transfer', '_src', '_dst', '_artifact_cache')
+
+    def __init__(self, transfer: str, artifact_cache: ArtifactCache = None) -> None:
         self._transfer = transfer
         self._src, self._dst = re.split(r'(?<!\\):', transfer, 1)
+        self._artifact_cache = artifact_cache
 
     @property
     def src(self) -> str:
@@ -11,4 +15,9 @@ class ActionTransfer:
     
     @property
     def dst(self) -> str:
-        return self._dst
\ No newline at end of file
+        return self._dst
+
+    # transfers without an artifact cache are copied with scp
+    @property
+    def artifact_cache(self) -> ArtifactCache:
+        return self._artifact_cache
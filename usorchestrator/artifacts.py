@@ -0,0 +1,223 @@
+import os
+import stat
+import json
+import shlex
+import logging
+import hashlib
+import tarfile
+import tempfile
+import threading
+
+__all__ = ['ArtifactCache', 'Artifact']
+
+"""
+Transfers sources are prepared once per run: the source is walked and hashed into a
+manifest, then packed into a tar archive (optionally gzip compressed) stored locally
+by content hash. Every host's transfer streams the same archive file to "tar -x" over
+ssh, instead of scp reading the whole source again for each host.
+
+Archives are kept between runs, so unchanged sources are not packed again. The least
+recently used archives are evicted above ARTIFACT_CACHE_MAX_SIZE bytes or
+ARTIFACT_CACHE_MAX_ENTRIES archives.
+"""
+
+ARTIFACT_CACHE_DEFAULT_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'), 'usorchestrator', 'artifacts')
+ARTIFACT_CACHE_MAX_SIZE = 1024 ** 3
+ARTIFACT_CACHE_MAX_ENTRIES = 50
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+class Artifact:
+    __slots__ = ('_name', '_hash', '_path', '_compressed')
+
+    def __init__(self, name: str, artifact_hash: str, path: str, compressed: bool) -> None:
+        self._name: str = name
+        self._hash: str = artifact_hash
+        self._path: str = path
+        self._compressed: bool = compressed
+
+    # name of the archive's top level entry (source base name)
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def hash(self) -> str:
+        return self._hash
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @property
+    def compressed(self) -> bool:
+        return self._compressed
+
+    # archive content is expected on stdin
+    def gen_extract(self, dst: str) -> str:
+        # as scp, remote paths are relative to the home directory
+        if dst in ('', '~'):
+            dst = '"$HOME"'
+        elif dst.startswith('~/'):
+            dst = '"$HOME"/' + shlex.quote(dst[2:])
+        else:
+            dst = shlex.quote(dst)
+
+        # as scp (without -p), owners and modification times are not preserved
+        tar_cmd = 'tar --no-same-owner -x -m' + (' -z' if self._compressed else '') + ' -f -'
+
+        cmd_parts = ['set -e']
+
+        cmd_parts.append(f'__usorchestrator_dst={dst}')
+        # as scp, copy into the destination if it's a directory, otherwise to the destination path
+        cmd_parts.append('if [ -d "$__usorchestrator_dst" ]; then')
+        cmd_parts.append(f'    {tar_cmd} -C "$__usorchestrator_dst"')
+        cmd_parts.append('else')
+        cmd_parts.append('    __usorchestrator_tmp=$(mktemp -d "$(dirname "$__usorchestrator_dst")/.usorchestrator.XXXXXX")')
+        cmd_parts.append('    trap \'rm -rf "$__usorchestrator_tmp"\' EXIT')
+        cmd_parts.append(f'    {tar_cmd} -C "$__usorchestrator_tmp"')
+        cmd_parts.append(f'    mv -f "$__usorchestrator_tmp"/{shlex.quote(self._name)} "$__usorchestrator_dst"')
+        cmd_parts.append('fi')
+
+        return '\n'.join(cmd_parts)
+
+class ArtifactCache:
+    def __init__(self, path: str = None, *, compress: bool = False) -> None:
+        self._path: str = path or ARTIFACT_CACHE_DEFAULT_PATH
+        self._compress: bool = compress
+
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._lock: threading.Lock = threading.Lock()
+        self._sources_locks: dict[str, threading.Lock] = {}
+
+        # artifacts prepared during this run, by source
+        self._artifacts: dict[str, Artifact] = {}
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    # prepare the source once, hosts transferring the same source wait for it
+    def prepare(self, src: str) -> Artifact:
+        with self._lock:
+            source_lock = self._sources_locks.setdefault(src, threading.Lock())
+
+        with source_lock:
+            artifact = self._artifacts.get(src)
+
+            if artifact is None:
+                artifact = self._prepare(src)
+
+                with self._lock:
+                    self._artifacts[src] = artifact
+
+            return artifact
+
+    def _prepare(self, src: str) -> Artifact:
+        name = os.path.basename(os.path.normpath(src))
+        manifest = self._gen_manifest(src)
+
+        artifact_hash = hashlib.sha256(json.dumps({'name': name, 'compressed': self._compress, 'manifest': manifest}).encode('utf-8')).hexdigest()
+        path = os.path.join(self._path, artifact_hash + ('.tar.gz' if self._compress else '.tar'))
+
+        if os.path.exists(path):
+            # refresh archive mtime, used for eviction
+            os.utime(path)
+            self._logger.debug(f'Reusing artifact "{path}" for "{src}"')
+        else:
+            self._pack(src, name, path)
+            self._logger.debug(f'Packed artifact "{path}" for "{src}"')
+
+            self._evict(path)
+
+        return Artifact(name, artifact_hash, path, self._compress)
+
+    # entries are followed through symlinks, as scp does
+    def _gen_manifest(self, src: str) -> list:
+        manifest = []
+
+        for (path, relpath) in self._walk(src):
+            st = os.stat(path)
+
+            if stat.S_ISDIR(st.st_mode):
+                manifest.append([relpath, 'dir', stat.S_IMODE(st.st_mode)])
+            elif stat.S_ISREG(st.st_mode):
+                manifest.append([relpath, 'file', stat.S_IMODE(st.st_mode), self._hash_file(path)])
+
+        return manifest
+
+    def _walk(self, src: str):
+        yield (src, '')
+
+        if not os.path.isdir(src):
+            return
+
+        for (root, dirs, files) in os.walk(src, followlinks=True, onerror=self._raise):
+            dirs.sort()
+
+            for name in sorted(dirs + files):
+                path = os.path.join(root, name)
+                yield (path, os.path.relpath(path, src))
+
+    def _raise(self, e: OSError) -> None:
+        raise e
+
+    def _hash_file(self, path: str) -> str:
+        file_hash = hashlib.sha256()
+
+        with open(path, 'rb') as f:
+            while chunk := f.read(HASH_CHUNK_SIZE):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
+
+    def _pack(self, src: str, name: str, path: str) -> None:
+        os.makedirs(self._path, exist_ok=True)
+
+        # written to a temporary file first, so concurrent runs never read partial archives
+        (fd, tmp_path) = tempfile.mkstemp(dir=self._path, prefix='.pack.')
+
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                with tarfile.open(fileobj=f, mode='w:gz' if self._compress else 'w', dereference=True) as tar:
+                    tar.add(src, arcname=name, filter=self._reset_owner)
+
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _reset_owner(self, tarinfo: tarfile.TarInfo) -> tarfile.TarInfo:
+        tarinfo.uid = tarinfo.gid = 0
+        tarinfo.uname = tarinfo.gname = ''
+
+        return tarinfo
+
+    # evict the least recently used archives, except the ones used by this run
+    def _evict(self, packed_path: str) -> None:
+        with self._lock:
+            in_use = {packed_path, *(artifact.path for artifact in self._artifacts.values())}
+
+        archives = []
+
+        for entry in os.scandir(self._path):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+
+            st = entry.stat()
+            archives.append((st.st_mtime, st.st_size, entry.path))
+
+        total_size = 0
+
+        for (count, (_, size, path)) in enumerate(sorted(archives, reverse=True), 1):
+            total_size += size
+
+            if path in in_use or (total_size <= ARTIFACT_CACHE_MAX_SIZE and count <= ARTIFACT_CACHE_MAX_ENTRIES):
+                continue
+
+            self._logger.debug(f'Evicting artifact "{path}"')
+
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,216 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from usorchestrator.action_exec import ActionExec
+
+__all__ = ['History']
+
+"""
+Local SQLite store of the results of all runs, so results can be queried and
+compared between runs without touching the hosts.
+
+Outputs are deduplicated by content hash, as most hosts produce the same output
+for the same action run after run. Results whose output was not read (ex: with
+--summary) are saved with their status only, and their output is not compared.
+
+Results are committed one by one in WAL mode, so concurrent runs (ex: a --watch
+session) and history queries never wait on a run in progress.
+"""
+
+HISTORY_DEFAULT_PATH = os.path.join(os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share'), 'usorchestrator', 'history.db')
+HISTORY_BUSY_TIMEOUT = 10
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    description TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    hash TEXT PRIMARY KEY,
+    content BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    host TEXT NOT NULL,
+    action_type TEXT NOT NULL,
+    action_name TEXT NOT NULL,
+    return_code INTEGER NOT NULL,
+    passed_condition INTEGER NOT NULL,
+    started_at REAL,
+    duration REAL,
+    stdout_hash TEXT REFERENCES outputs(hash),
+    stderr_hash TEXT REFERENCES outputs(hash),
+    output_recorded INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (run_id, host);
+CREATE INDEX IF NOT EXISTS results_host ON results (host, started_at);
+CREATE INDEX IF NOT EXISTS results_action ON results (action_name, started_at);
+CREATE INDEX IF NOT EXISTS results_return_code ON results (return_code, started_at);
+CREATE INDEX IF NOT EXISTS results_started_at ON results (started_at);
+"""
+
+RESULT_COLUMNS = 'r.run_id, r.host, r.action_type, r.action_name, r.return_code, r.passed_condition, r.started_at, r.duration, r.stdout_hash, r.stderr_hash, r.output_recorded'
+
+class History:
+    def __init__(self, path: str = None) -> None:
+        self._path: str = path or HISTORY_DEFAULT_PATH
+
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+
+        self._logger: logging.Logger = logging.getLogger(__name__)
+
+        # results are recorded from the worker threads
+        self._db: sqlite3.Connection = sqlite3.connect(self._path, timeout=HISTORY_BUSY_TIMEOUT, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        self._lock: threading.Lock = threading.Lock()
+
+        self._run_id: int = None
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    def start_run(self, description: dict) -> int:
+        with self._lock:
+            cursor = self._db.execute('INSERT INTO runs (started_at, description) VALUES (?, ?)', (time.time(), json.dumps(description)))
+            self._db.commit()
+            self._run_id = cursor.lastrowid
+
+        return self._run_id
+
+    def finish_run(self) -> None:
+        if self._run_id is None:
+            return
+
+        with self._lock:
+            try:
+                self._db.execute('UPDATE runs SET finished_at = ? WHERE id = ?', (time.time(), self._run_id))
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._logger.exception(f'Could not finish history run: {e}', exc_info=True)
+
+            self._run_id = None
+
+    def record(self, host: str, action_type: str, action_name: str, action_exec: ActionExec) -> None:
+        output_recorded = not action_exec.output_discarded
+        stdout = b'\n'.join(filter(None, action_exec.raw_stdout)) if output_recorded else b''
+        stderr = b'\n'.join(filter(None, action_exec.raw_stderr)) if output_recorded else b''
+
+        # history failures must not abort the orchestration
+        with self._lock:
+            try:
+                stdout_hash = self._store_output(stdout)
+                stderr_hash = self._store_output(stderr)
+
+                self._db.execute(
+                    'INSERT INTO results (run_id, host, action_type, action_name, return_code, passed_condition, started_at, duration, stdout_hash, stderr_hash, output_recorded) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (self._run_id, host, action_type, action_name, action_exec.return_code, int(action_exec.passed_condition), action_exec.started_at, action_exec.duration, stdout_hash, stderr_hash, int(output_recorded)),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                self._db.rollback()
+                self._logger.exception(f'Could not record "{action_name}" {action_type} result for "{host}" in history: {e}', exc_info=True)
+
+    def close(self) -> None:
+        self.finish_run()
+        self._db.close()
+
+    def runs(self, *, hosts: list[str] = None, actions: list[str] = None, since: float = None, limit: int = 20) -> list[sqlite3.Row]:
+        (where, params) = self._gen_filters(hosts=hosts, actions=actions, since=since)
+
+        query = f"""
+            SELECT runs.id, runs.started_at, runs.finished_at, runs.description,
+                COUNT(r.id) AS results,
+                SUM(r.passed_condition AND r.return_code != 0) AS failed,
+                SUM(NOT r.passed_condition) AS skipped
+            FROM runs JOIN results r ON r.run_id = runs.id
+            {where}
+            GROUP BY runs.id
+            ORDER BY runs.id DESC
+            LIMIT ?
+        """
+
+        return self._db.execute(query, (*params, limit)).fetchall()
+
+    def results(self, run_id: int, *, hosts: list[str] = None, actions: list[str] = None) -> list[sqlite3.Row]:
+        (where, params) = self._gen_filters(hosts=hosts, actions=actions, run_id=run_id)
+
+        return self._db.execute(f'SELECT {RESULT_COLUMNS} FROM results r {where} ORDER BY r.id', params).fetchall()
+
+    # latest result of each host and action, up to the given time
+    def latest_results(self, *, hosts: list[str] = None, actions: list[str] = None, until: float = None) -> list[sqlite3.Row]:
+        (where, params) = self._gen_filters(hosts=hosts, actions=actions, until=until)
+
+        # sqlite returns the values of the row holding MAX() for bare columns
+        query = f"""
+            SELECT {RESULT_COLUMNS}, MAX(r.id) AS id
+            FROM results r
+            {where}
+            GROUP BY r.host, r.action_type, r.action_name
+        """
+
+        return self._db.execute(query, params).fetchall()
+
+    def output(self, output_hash: str) -> bytes:
+        if output_hash is None:
+            return b''
+
+        row = self._db.execute('SELECT content FROM outputs WHERE hash = ?', (output_hash,)).fetchone()
+
+        return row['content'] if row else b''
+
+    # columns added to existing databases
+    def _migrate(self) -> None:
+        columns = {row['name'] for row in self._db.execute('PRAGMA table_info(results)')}
+
+        if 'output_recorded' not in columns:
+            self._db.execute('ALTER TABLE results ADD COLUMN output_recorded INTEGER NOT NULL DEFAULT 1')
+            self._db.commit()
+
+    def _store_output(self, content: bytes) -> str:
+        if not content:
+            return None
+
+        output_hash = hashlib.sha256(content).hexdigest()
+        self._db.execute('INSERT OR IGNORE INTO outputs (hash, content) VALUES (?, ?)', (output_hash, content))
+
+        return output_hash
+
+    def _gen_filters(self, *, hosts: list[str] = None, actions: list[str] = None, run_id: int = None, since: float = None, until: float = None) -> tuple[str, list]:
+        conditions = []
+        params = []
+
+        if hosts:
+            conditions.append(f'r.host IN ({", ".join("?" * len(hosts))})')
+            params += hosts
+
+        if actions:
+            conditions.append(f'r.action_name IN ({", ".join("?" * len(actions))})')
+            params += actions
+
+        if run_id is not None:
+            conditions.append('r.run_id = ?')
+            params.append(run_id)
+
+        if since is not None:
+            conditions.append('r.started_at >= ?')
+            params.append(since)
+
+        if until is not None:
+            conditions.append('r.started_at <= ?')
+            params.append(until)
+
+        where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+        return (where, params)
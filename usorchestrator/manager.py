@@ -4,15 +4,34 @@ import uuid
 import glob
 import os
 import shlex
+import json
+import time
+import random
+import shutil
+import tempfile
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from configparser import RawConfigParser, NoSectionError, NoOptionError
 from usorchestrator.action import Action
-from usorchestrator.remote import Remote
+from usorchestrator.remote import Remote, REMOTE_PATTERN
 from usorchestrator.action_exec import ActionExec
 from usorchestrator.action_transfer import ActionTransfer
+from usorchestrator.artifacts import ArtifactCache
 from usorchestrator.action_output import ActionOutput
+from usorchestrator.progress import ProgressRenderer
+from usorchestrator.resource_limits import ResourceLimits
+from usorchestrator.resolver import Resolver
+from usorchestrator.relay import Relay, RelayProgress
+from usorchestrator.profiler import Profiler
+from usorchestrator.history import History
+from usorchestrator.summary import Summary
+from usorchestrator.remote_cmd import enable_ssh_multiplexing, disable_ssh_multiplexing, OUTPUT_CAPTURE, OUTPUT_SPOOL, OUTPUT_DISCARD
 
 __all__ = ['UsOrchestratorManager', 'UsOrchestratorConfigError']
 
+# default watch jitter, as a fraction of the watch interval
+WATCH_DEFAULT_JITTER = 0.1
+
 class UsOrchestratorConfigError(Exception):
     pass
 
@@ -25,6 +44,18 @@ class UsOrchestratorManager:
         self._hosts_config: RawConfigParser = self._parse_config('hosts')
         self._routines_config: RawConfigParser = self._parse_config('routines')
 
+        self._resource_limits: ResourceLimits = ResourceLimits()
+        self._resolver: Resolver = Resolver()
+        self._profiler: Profiler = None
+        self._history_db: str = params.get('history_db')
+        self._history: History = None
+        self._watch_results: dict = None
+        self._summary: Summary = None
+        self._artifact_cache: ArtifactCache = None
+
+        # filters of the results whose output is kept (None keeps all outputs)
+        self._output_filters: list = None
+
     def show(self, show_type: str) -> None:
         if show_type == 'hosts_groups':
             hosts_sections = self._hosts_config.sections()
@@ -35,8 +66,61 @@ class UsOrchestratorManager:
         else:
             raise ValueError(f'Unknown show type "{show_type}"')
 
+    # query results history, without touching the hosts
+    def history(self, params: dict) -> None:
+        history = History(self._history_db)
+        hosts = params.get('hosts')
+        actions = params.get('actions')
+
+        try:
+            if params.get('run') is not None:
+                self._show_history_run(history, params['run'], hosts=hosts, actions=actions)
+            elif params.get('diff'):
+                (run_a, run_b) = params['diff']
+
+                before = history.results(run_a, hosts=hosts, actions=actions)
+                after = history.results(run_b, hosts=hosts, actions=actions)
+
+                self._show_history_diff(before, after, removed=True)
+            elif params.get('diff_since'):
+                since = time.time() - self._parse_duration(params['diff_since'])
+
+                before = history.latest_results(hosts=hosts, actions=actions, until=since)
+                # results not updated since the given time didn't change
+                after = [row for row in history.latest_results(hosts=hosts, actions=actions) if row['started_at'] is not None and row['started_at'] > since]
+
+                self._show_history_diff(before, after, removed=False)
+            else:
+                self._show_history_runs(history, hosts=hosts, actions=actions, limit=params.get('limit') or 20)
+        finally:
+            history.close()
+
+    # run as relay worker, orchestrating the hosts and actions received from the orchestrator on stdin
+    def worker(self) -> None:
+        try:
+            payload = json.load(sys.stdin)
+
+            hosts = list(self._process_hosts(payload['hosts']))
+
+            # the relay's share of the limits, restricting the actions limits sizes
+            self._resource_limits.define([f'{name}:{size}' for (name, size) in payload.get('limits', {}).items()])
+            actions = [Action.fromDict(action, self._resource_limits) for action in payload['actions']]
+
+            self._resolver.resolve(hosts)
+            self._output_filters = payload.get('output_filters')
+
+            progress = RelayProgress(hosts, actions)
+            self._handle_actions(hosts, actions, data=payload['data'], concurrency=payload['concurrency'], body_concurrency=payload.get('body_concurrency'), progress=progress)
+        except KeyboardInterrupt:
+            # ignore keyboard intrerupt error
+            pass
+
     def orchestrate(self, params: dict) -> None:
         try:
+            if params.get('profile'):
+                self._profiler = Profiler(params['profile'], output=params.get('profile_output'), on_demand=params.get('profile_on_demand', False))
+                self._profiler.start()
+
             self._do_orchestrate(params)
         except KeyboardInterrupt:
             # ignore keyboard intrerupt error
@@ -54,15 +138,24 @@ class UsOrchestratorManager:
             sys.exit(0)
    
     def _do_orchestrate(self, params: dict[any]) -> None:
-        hosts: list[Remote] = []
+        relays: list[Relay] = []
+        direct_relays: list[Relay] = []
         actions: list[Action] = []
         data: dict = {}
         filters: list = []
+        concurrency: int = params.get('concurrency') or 1
+        body_concurrency: int = params.get('body_concurrency')
+        hosts_count: int = 0
+
+        # transfers sources are prepared once and streamed to all hosts
+        self._artifact_cache = ArtifactCache(compress=params.get('transfer_compress', False))
 
+        # hosts are only validated and counted here, being parsed while orchestrating
         if params.get('hosts'):
-            hosts += self._process_hosts(params['hosts'])
+            hosts_count += self._count_hosts(params['hosts'])
         if params.get('hosts_groups'):
-            hosts += self._process_hosts_groups(params['hosts_groups'])
+            hosts_count += self._count_hosts_groups(params['hosts_groups'])
+            relays += self._process_relays(params['hosts_groups'])
 
         if params.get('commands'):
             actions += self._process_commands(params['commands'])
@@ -71,7 +164,7 @@ class UsOrchestratorManager:
         if params.get('transfers'):
             actions += self._process_transfers(params['transfers'])
 
-        if not hosts:
+        if not hosts_count and not relays:
             print('At least one of the following options for hosts identification must be provided: "--host", "--hosts-group"')
             sys.exit(1)
 
@@ -79,17 +172,213 @@ class UsOrchestratorManager:
             print('At least one of the following options for actions execution must be provided: "--command", "--routine", "--transfer"')
             sys.exit(1)
 
+        # transfers sources are local to the orchestrator, relayed hosts are orchestrated directly
+        if relays and any(action.hasTransfers() for action in actions):
+            self._logger.warning('Transfers can not be delegated to relays, orchestrating relayed hosts directly')
+
+            direct_relays = relays
+            relays = []
+            hosts_count += sum(len(relay.raw_hosts) for relay in direct_relays)
+
+        if relays:
+            self._share_limits(relays, direct=hosts_count > 0)
+
+        self._resolver.resolve([relay.remote for relay in relays])
+        hosts = self._resolver.resolve_iter(self._iter_hosts(params, direct_relays))
+
         if params.get('data'):
             data = self._parse_data(params['data'])
 
         if params.get('filters'):
             filters = self._parse_filters(params['filters'])
 
-        self._handle_actions(hosts, actions, data=data, filters=filters)
+        if concurrency < 1:
+            print(f'Invalid concurrency: "{concurrency}"')
+            self._logger.error(f'Invalid concurrency: "{concurrency}"')
+            sys.exit(1)
+
+        if body_concurrency is not None and body_concurrency < 1:
+            print(f'Invalid body concurrency: "{body_concurrency}"')
+            self._logger.error(f'Invalid body concurrency: "{body_concurrency}"')
+            sys.exit(1)
+
+        if params.get('history', True):
+            self._history = History(self._history_db)
+            self._history.start_run({
+                'hosts': params.get('hosts') or [],
+                'hosts_groups': params.get('hosts_groups') or [],
+                'actions': [action.name for action in actions],
+            })
+
+        if params.get('summary'):
+            self._summary = Summary()
+
+        # summaries (and their history entries) don't include outputs, otherwise outputs are only
+        # read for the results matching the filters (saved to history with their status only),
+        # except in watch mode where outputs are compared between runs
+        if self._summary:
+            self._output_filters = []
+        elif not params.get('watch'):
+            self._output_filters = filters or None
+
+        if params.get('watch'):
+            interval = self._parse_duration(params['watch'])
+            jitter = self._parse_duration(params['watch_jitter']) if params.get('watch_jitter') else interval * WATCH_DEFAULT_JITTER
+
+            if interval <= 0 or jitter < 0:
+                print(f'Invalid watch interval: "{params["watch"]}"')
+                self._logger.error(f'Invalid watch interval: "{params["watch"]}"')
+                sys.exit(1)
+
+            self._watch(list(hosts), actions, interval=interval, jitter=min(jitter, interval), hosts_count=hosts_count, relays=relays, data=data, filters=filters, concurrency=concurrency, body_concurrency=body_concurrency)
+        else:
+            self._handle_actions(hosts, actions, hosts_count=hosts_count, relays=relays, data=data, filters=filters, concurrency=concurrency, body_concurrency=body_concurrency)
+
         sys.exit(0)
 
+    # split fixed size resource limits between the orchestrator (for directly orchestrated hosts)
+    # and the relays, "auto" limits being sized by each machine to its own CPUs
+    def _share_limits(self, relays: list[Relay], *, direct: bool) -> None:
+        sites = len(relays) + (1 if direct else 0)
+        relays_limits = [{} for _ in relays]
+
+        for limit in self._resource_limits.limits:
+            if limit.auto:
+                continue
+
+            (share, remainder) = divmod(limit.size, sites)
+            shares = [max(share + (1 if i < remainder else 0), 1) for i in range(sites)]
+
+            for (relay_limits, relay_share) in zip(relays_limits, shares):
+                relay_limits[limit.name] = relay_share
+
+            if direct:
+                limit.share(shares[-1])
+
+            self._logger.debug(f'Limit "{limit.name}" split between orchestrator and relays: {shares}')
+
+        for (relay, relay_limits) in zip(relays, relays_limits):
+            relay.setLimits(relay_limits)
+
+    # re-run the same plan periodically, keeping ssh connections open and reporting only changed results
+    def _watch(self, hosts: list[Remote], actions: list[Action], *, interval: float, jitter: float, hosts_count: int = 0, relays: list[Relay] = None, data: dict = None, filters: list = None, concurrency: int = 1, body_concurrency: int = None) -> None:
+        control_dir = tempfile.mkdtemp(prefix='usorchestrator-ssh-')
+        enable_ssh_multiplexing(control_dir, int(interval * 2) + 60)
+
+        self._watch_results = {}
+
+        try:
+            while True:
+                started = time.monotonic()
+
+                # cached names are only resolved again once expired
+                self._resolver.resolve(hosts + [relay.remote for relay in relays or []])
+                self._handle_actions(hosts, actions, hosts_count=hosts_count, relays=relays, data=data, filters=filters, concurrency=concurrency, body_concurrency=body_concurrency, jitter=jitter)
+
+                time.sleep(max(interval - (time.monotonic() - started), 0))
+        finally:
+            disable_ssh_multiplexing()
+            shutil.rmtree(control_dir, ignore_errors=True)
+
+    # check if the result changed since the previous watch tick
+    def _watch_changed(self, action_output: ActionOutput, action_exec: ActionExec) -> bool:
+        host = action_output.host
+        action = action_output.action
+
+        key = (host.user, host.host, host.port, action.type, action.name)
+        result = hash((action_exec.return_code, action_exec.passed_condition, tuple(action_exec.raw_stdout), tuple(action_exec.raw_stderr)))
+
+        previous = self._watch_results.get(key)
+        self._watch_results[key] = result
+
+        return previous != result
+
+    def _show_history_runs(self, history: History, *, hosts: list = None, actions: list = None, limit: int = 20) -> None:
+        for run in history.runs(hosts=hosts, actions=actions, limit=limit):
+            description = json.loads(run['description'] or '{}')
+            started_at = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started_at']))
+            duration = f'{run["finished_at"] - run["started_at"]:.1f}s' if run['finished_at'] else 'unfinished'
+
+            print(f'Run {run["id"]} at {started_at} ({duration}): {run["results"]} results, {run["failed"]} failed, {run["skipped"]} skipped, actions {description.get("actions", [])}')
+
+    def _show_history_run(self, history: History, run_id: int, *, hosts: list = None, actions: list = None) -> None:
+        for row in history.results(run_id, hosts=hosts, actions=actions):
+            action_output = ActionOutput(Action(row['action_type'], row['action_name']), Remote(row['host']))
+            action_exec = ActionExec(stdout=[history.output(row['stdout_hash'])], stderr=[history.output(row['stderr_hash'])], return_code=row['return_code'], passed_condition=bool(row['passed_condition']))
+
+            action_output.print_info(action_exec)
+
+    def _show_history_diff(self, before: list, after: list, *, removed: bool) -> None:
+        key = lambda row: (row['host'], row['action_type'], row['action_name'])
+        # outputs are only compared when recorded on both sides
+        state = lambda row, output: (row['return_code'], row['passed_condition']) + ((row['stdout_hash'], row['stderr_hash']) if output else ())
+
+        before = {key(row): row for row in before}
+        after = {key(row): row for row in after}
+        counts = {'changed': 0, 'new': 0, 'removed': 0}
+
+        for (row_key, row) in after.items():
+            (host, action_type, action_name) = row_key
+            previous = before.get(row_key)
+
+            if previous is None:
+                counts['new'] += 1
+                print(f'+ "{action_name}" {action_type} for "{host}": return code {row["return_code"]}')
+                continue
+
+            output = previous['output_recorded'] and row['output_recorded']
+
+            if state(previous, output) == state(row, output):
+                continue
+
+            changes = []
+
+            if previous['return_code'] != row['return_code']:
+                changes.append(f'return code {previous["return_code"]} -> {row["return_code"]}')
+            if previous['passed_condition'] != row['passed_condition']:
+                changes.append('condition ' + ('met' if row['passed_condition'] else 'not met'))
+            if output and previous['stdout_hash'] != row['stdout_hash']:
+                changes.append('output changed')
+            if output and previous['stderr_hash'] != row['stderr_hash']:
+                changes.append('errors changed')
+
+            counts['changed'] += 1
+            print(f'~ "{action_name}" {action_type} for "{host}": {", ".join(changes)}')
+
+        if removed:
+            for (row_key, row) in before.items():
+                if row_key in after:
+                    continue
+
+                (host, action_type, action_name) = row_key
+                counts['removed'] += 1
+                print(f'- "{action_name}" {action_type} for "{host}"')
+
+        print(f'{counts["changed"]} changed, {counts["new"]} new' + (f', {counts["removed"]} removed' if removed else ''))
+
+    # durations are provided as number of seconds, optionally with a unit (s, m, h, d)
+    def _parse_duration(self, duration: str) -> float:
+        units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+        try:
+            if duration and duration[-1] in units:
+                return float(duration[:-1]) * units[duration[-1]]
+
+            return float(duration)
+        except ValueError:
+            print(f'Invalid duration: "{duration}"')
+            self._logger.error(f'Invalid duration: "{duration}"')
+            sys.exit(1)
+
     def _cleanup(self) -> None:
-        pass
+        if self._history:
+            self._history.close()
+            self._history = None
+
+        if self._profiler:
+            self._profiler.stop()
+            print(f'Profile report written to "{self._profiler.output}"')
+            self._profiler = None
 
     def _gen_logger(self, log_file: str, log_level: str, instance_id: str) -> logging.Logger:
         levels = {
@@ -151,6 +440,7 @@ class UsOrchestratorManager:
 
     # data is provided as a list formatted in ENV style
     # example: --data "key1=value1" --data "key2=value2"
+    # values can be read from a file with "key=@path" (or from stdin with "key=@-"), "key=@@value" escapes a literal "@"
     def _parse_data(self, data_files: list[str]) -> dict:
         data: dict = {}
 
@@ -170,10 +460,27 @@ class UsOrchestratorManager:
                 self._logger.error(f'Invalid data format: key is empty')
                 sys.exit(1)
 
+            if value.startswith('@@'):
+                value = value[1:]
+            elif value.startswith('@'):
+                value = self._read_data_file(key, value[1:])
+
             data[key] = value
 
         return data
     
+    def _read_data_file(self, key: str, path: str) -> str:
+        try:
+            if path == '-':
+                return sys.stdin.read()
+
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f'Could not read data "{key}" from "{path}": {e}')
+            self._logger.exception(f'Could not read data "{key}" from "{path}": {e}', exc_info=True)
+            sys.exit(1)
+
     def _parse_filters(self, filters: list[str]) -> list:
         for filter in filters:
             if filter not in ['exec_ok', 'exec_failed', 'condition_ok', 'condition_failed']:
@@ -184,33 +491,83 @@ class UsOrchestratorManager:
         return filters
 
     # process hosts
-    def _process_hosts(self, raw_hosts: list[str]) -> list:
-        hosts = []
+    def _process_hosts(self, raw_hosts: list[str]) -> Iterator[Remote]:
+        self._logger.debug(f'Discovered hosts: "{raw_hosts}"')
 
         for host in raw_hosts:
-            hosts.append(Remote(host))
+            yield Remote(host)
 
-        self._logger.debug(f'Discovered hosts: "{raw_hosts}"')
+    def _count_hosts(self, raw_hosts: list[str]) -> int:
+        for host in raw_hosts:
+            if not REMOTE_PATTERN.match(host):
+                print(f'Could not extract hosts: Invalid remote string "{host}"')
+                self._logger.error(f'Could not extract hosts: Invalid remote string "{host}"')
+                sys.exit(1)
 
-        return hosts
+        return len(raw_hosts)
 
     # process hosts_groups
-    def _process_hosts_groups(self, hosts_groups: list[str]) -> list:
-        hosts = []
+    def _process_hosts_groups(self, hosts_groups: list[str]) -> Iterator[Remote]:
+        for hosts_group in hosts_groups:
+            # hosts of groups with a relay are orchestrated by the relay
+            if self._hosts_config.has_option(hosts_group, 'relay'):
+                continue
+
+            raw_hosts = shlex.split(self._hosts_config.get(hosts_group, 'hosts', fallback=''))
+
+            self._logger.debug(f'Discovered hosts "{raw_hosts}" from hosts config')
+
+            for host in raw_hosts:
+                yield Remote(host)
+
+    def _count_hosts_groups(self, hosts_groups: list[str]) -> int:
+        count = 0
 
         for hosts_group in hosts_groups:
             try:
-                raw_hosts = shlex.split(self._hosts_config.get(hosts_group, 'hosts', fallback=''))
-                for host in raw_hosts:
-                    hosts.append(Remote(host))
+                if self._hosts_config.has_option(hosts_group, 'relay'):
+                    continue
+
+                count += self._count_hosts(shlex.split(self._hosts_config.get(hosts_group, 'hosts', fallback='')))
             except (NoSectionError, NoOptionError) as e:
                 print(f'Could not extract hosts: {e}')
                 self._logger.exception(f'Could not extract hosts: {e}', exc_info=True)
                 sys.exit(1)
 
-            self._logger.debug(f'Discovered hosts "{raw_hosts}" from hosts config')
+        return count
+
+    # iterate all hosts orchestrated directly, without keeping them in memory
+    def _iter_hosts(self, params: dict, relays: list[Relay]) -> Iterator[Remote]:
+        if params.get('hosts'):
+            yield from self._process_hosts(params['hosts'])
+        if params.get('hosts_groups'):
+            yield from self._process_hosts_groups(params['hosts_groups'])
+
+        for relay in relays:
+            yield from self._process_hosts(relay.raw_hosts)
 
-        return hosts
+    # process hosts_groups delegated to relays
+    def _process_relays(self, hosts_groups: list[str]) -> list[Relay]:
+        relays = []
+
+        for hosts_group in hosts_groups:
+            if not self._hosts_config.has_option(hosts_group, 'relay'):
+                continue
+
+            raw_hosts = shlex.split(self._hosts_config.get(hosts_group, 'hosts', fallback=''))
+            relay = self._hosts_config.get(hosts_group, 'relay')
+            relay_command = self._hosts_config.get(hosts_group, 'relay_command', fallback=None)
+
+            try:
+                relays.append(Relay(relay, raw_hosts, relay_command))
+            except ValueError as e:
+                print(f'Could not extract relay: {e}')
+                self._logger.exception(f'Could not extract relay: {e}', exc_info=True)
+                sys.exit(1)
+
+            self._logger.debug(f'Discovered hosts "{raw_hosts}" relayed by "{relay}" from hosts config')
+
+        return relays
 
     # process commands
     def _process_commands(self, commands: list[str]) -> list[Action]:
@@ -245,6 +602,7 @@ class UsOrchestratorManager:
             
             data_definition = self._process_data_definition(self._routines_config.get(routine, 'data', fallback=''))
             requires = shlex.split(self._routines_config.get(routine, 'requires', fallback=''))
+            limits = self._resource_limits.define(shlex.split(self._routines_config.get(routine, 'limits', fallback='')))
 
             action = Action('routine', routine)
 
@@ -254,9 +612,13 @@ class UsOrchestratorManager:
 
             # set action commands and requirements
             action.addCommand(self._routines_config.get(routine, 'command', fallback='').strip())
-            action.addTransfer(self._routines_config.get(routine, 'transfer', fallback=''))
+            transfer = self._routines_config.get(routine, 'transfer', fallback='').strip()
+
+            if transfer:
+                action.addTransfer(ActionTransfer(transfer, self._artifact_cache))
             action.setDataDefinition(data_definition)
             action.setRequirements(requires)
+            action.setLimits(limits)
             
             # add condition action (only one of ifroutine, ifcommand option is supported, not multiple)
             if self._routines_config.has_option(routine, 'ifroutine'):
@@ -272,7 +634,7 @@ class UsOrchestratorManager:
                 doroutines_cnf = shlex.split(self._routines_config.get(routine, 'doroutines', fallback=''))
                 for doroutine_cnf in doroutines_cnf:
                     action.addAction(self._process_routine(doroutine_cnf))
-        except (NoSectionError, NoOptionError) as e:
+        except (NoSectionError, NoOptionError, ValueError) as e:
             print(f'Could not extract routine: {e}')
             self._logger.exception(f'Could not extract routine: {e}', exc_info=True)
             sys.exit(1)
@@ -293,7 +655,7 @@ class UsOrchestratorManager:
     
     def _process_transfer(self, transfer: str) -> Action:
         action = Action('transfer', transfer)
-        action.addTransfer(ActionTransfer(transfer))
+        action.addTransfer(ActionTransfer(transfer, self._artifact_cache))
 
         self._logger.debug(f'Discovered "{action.name}" transfer action')
 
@@ -319,56 +681,209 @@ class UsOrchestratorManager:
         return data_dict
 
     # handle actions for all hosts
-    def _handle_actions(self, hosts: list[Remote], actions: list[Action], *, data: dict = None, filters: list = None) -> None:
+    # with body_concurrency, conditions are evaluated on all hosts before the actions bodies
+    def _handle_actions(self, hosts: Iterable[Remote], actions: list[Action], *, hosts_count: int = 0, relays: list[Relay] = None, data: dict = None, filters: list = None, concurrency: int = 1, body_concurrency: int = None, jitter: float = 0, progress = None) -> None:
         self._logger.debug('Starting processing actions on all hosts')
 
-        spliced_hosts = []
+        relays = relays or []
+        spliced_jobs = []
+
+        if progress is None:
+            total = hosts_count * len(actions) + sum(len(relay.raw_hosts) * len(actions) for relay in relays)
+            progress = ProgressRenderer(total)
+
+        progress.start()
+
+        try:
+            # relays orchestrate their hosts in parallel with the directly orchestrated hosts
+            with ThreadPoolExecutor(max_workers=max(len(relays), 1), thread_name_prefix='usorchestrator-relay') as relay_executor:
+                result_handler = lambda action_output, action_exec: self._handle_result(action_output, action_exec, progress, filters=filters)
+                relay_futures = [relay_executor.submit(relay.run, actions, progress, result_handler, data=data, concurrency=concurrency, body_concurrency=body_concurrency, output_filters=self._output_filters) for relay in relays]
+
+                jobs = self._gen_jobs(hosts, actions, spliced_jobs)
+
+                if body_concurrency:
+                    self._handle_jobs_phased(jobs, actions, progress, data=data, filters=filters, concurrency=concurrency, body_concurrency=body_concurrency)
+                else:
+                    if jitter:
+                        jobs = self._jitter_jobs(jobs, jitter)
+
+                    self._handle_jobs(jobs, progress, data=data, filters=filters, concurrency=concurrency)
+
+                for future in relay_futures:
+                    future.result()
+
+            if body_concurrency:
+                self._handle_jobs_phased(spliced_jobs, actions, progress, data=data, filters=filters, concurrency=concurrency, body_concurrency=body_concurrency)
+            else:
+                self._handle_jobs(spliced_jobs, progress, data=data, filters=filters, concurrency=concurrency)
 
+            if self._summary:
+                progress.write(self._summary.format(filters))
+                self._summary.reset()
+        finally:
+            progress.stop()
+
+    def _gen_jobs(self, hosts: Iterable[Remote], actions: list[Action], spliced_jobs: list[tuple]) -> Iterator[tuple]:
+        # actions with splice_localhost enabled are executed on local hosts after all other hosts
         for host in hosts:
-            for action in actions:
-                if action.splice_localhost and host.local:
-                    spliced_hosts.append(host)
-                    continue
-                self._handle_action(host, action, data=data, filters=filters)
+            host_actions = [action for action in actions if not (action.splice_localhost and host.local)]
+            spliced_actions = [action for action in actions if action.splice_localhost and host.local]
+
+            if spliced_actions: spliced_jobs.append((host, spliced_actions))
+            if host_actions: yield (host, host_actions)
+
+    # release jobs spread randomly over the jitter interval
+    def _jitter_jobs(self, jobs: Iterable[tuple], jitter: float) -> Iterator[tuple]:
+        started = time.monotonic()
+        delayed_jobs = sorted(((random.uniform(0, jitter), job) for job in jobs), key=lambda delayed_job: delayed_job[0])
+
+        for (delay, job) in delayed_jobs:
+            time.sleep(max(delay - (time.monotonic() - started), 0))
+            yield job
+
+    # handle jobs concurrently, actions of the same host being executed sequentially
+    def _handle_jobs(self, jobs: Iterable[tuple], progress, *, data: dict = None, filters: list = None, concurrency: int = 1) -> None:
+        self._run_jobs(lambda host, host_actions: self._handle_host_actions(host, host_actions, progress, data=data, filters=filters), jobs, concurrency)
+
+    # handle jobs one action at a time: conditions are evaluated on all hosts first,
+    # then the action body is executed on the hosts that passed them (with body_concurrency)
+    def _handle_jobs_phased(self, jobs: Iterable[tuple], actions: list[Action], progress, *, data: dict = None, filters: list = None, concurrency: int = 1, body_concurrency: int = 1) -> None:
+        jobs = list(jobs)
+
+        for action in actions:
+            hosts = [host for (host, host_actions) in jobs if action in host_actions]
+
+            if not hosts:
+                continue
+
+            # without a condition, the whole action is the body
+            if not action.condition:
+                self._run_jobs(lambda host: self._handle_action(host, action, progress, data=data, filters=filters), ((host,) for host in hosts), body_concurrency)
+                continue
+
+            # condition and body are executed as separate tasks
+            progress.add_total(len(hosts))
+            passed = set()
+
+            def handle_condition(host: Remote) -> None:
+                action_exec = self._handle_action(host, action, progress, data=data, filters=filters, phase='condition')
+
+                if action_exec and action_exec.passed_condition:
+                    passed.add(id(host))
+
+            self._run_jobs(handle_condition, ((host,) for host in hosts), concurrency)
+
+            passed_hosts = [host for host in hosts if id(host) in passed]
+            progress.add_total(len(passed_hosts) - len(hosts))
+
+            self._run_jobs(lambda host: self._handle_action(host, action, progress, data=data, filters=filters, phase='body'), ((host,) for host in passed_hosts), body_concurrency)
+
+    # run jobs concurrently, jobs being consumed as they are executed
+    def _run_jobs(self, func, jobs: Iterable[tuple], concurrency: int) -> None:
+        executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='usorchestrator-worker')
+        futures = set()
+        func = self._profiler.wrap(func) if self._profiler else func
+
+        try:
+            for job in jobs:
+                # bound the number of submitted jobs
+                if len(futures) >= concurrency * 2:
+                    (done, futures) = wait(futures, return_when=FIRST_COMPLETED)
+
+                    for future in done:
+                        future.result()
+
+                futures.add(executor.submit(func, *job))
+
+            for future in as_completed(futures):
+                future.result()
+        finally:
+            # on interruption, drop jobs that didn't start yet
+            executor.shutdown(wait=True, cancel_futures=True)
 
-        for host in spliced_hosts:
-            for action in actions:
-                if not host.local: continue
-                self._handle_action(host, action, data)
+    def _handle_host_actions(self, host: Remote, actions: list[Action], progress, *, data: dict = None, filters: list = None) -> None:
+        for action in actions:
+            self._handle_action(host, action, progress, data=data, filters=filters)
 
-    # handle individual action
-    def _handle_action(self, host: Remote, action: Action, *, data: dict = None, filters: list = None) -> None:
+    # handle individual action, or only its condition or body phase
+    def _handle_action(self, host: Remote, action: Action, progress, *, data: dict = None, filters: list = None, phase: str = None) -> ActionExec:
         action_output = ActionOutput(action, host)
-        action_output.print_temp_info()
+        task_id = progress.task_started(f'{host.host} ({phase})' if phase else host.host)
     
-        log_msg = f'Running "{action.name}" {action.type} on "{host.host}"'
+        log_msg = f'Running "{action.name}" {action.type}{f" {phase}" if phase else ""} on "{host.host}"'
         self._logger.debug(log_msg)
 
+        started_at = time.time()
+        started = time.monotonic()
+
+        output_mode = self._output_mode()
+
         try:
-            action_exec = action.runAction(host, data)
+            if phase == 'condition':
+                action_exec = action.runCondition(host, data, output_mode)
+            elif phase == 'body':
+                action_exec = action.runBody(host, data, output_mode)
+            else:
+                action_exec = action.runAction(host, data, output_mode)
         except Exception as e:
-            action_output.reset_temp_info()
-            print(f'ERROR: {e}')
+            progress.task_finished(task_id, failed=True)
+            progress.write(f'ERROR: {e}\n')
             self._logger.exception(e, exc_info=True)
+            return None
         else:
-            action_output.reset_temp_info()
+            action_exec.update(started_at=started_at, duration=time.monotonic() - started)
+            progress.task_finished(task_id, failed=action_exec.passed_condition and action_exec.return_code != 0)
 
-            if filters:
-                skip = True
+            # passed conditions are only reported with the body result
+            if phase == 'condition' and action_exec.passed_condition:
+                action_exec.discard_output()
+                return action_exec
 
-                if 'exec_ok' in filters and action_exec.return_code == 0:
-                    skip = False
+            # spooled output is only read if the result matches the filters
+            if self._output_filters is not None and not self._match_filters(self._output_filters, action_exec):
+                action_exec.discard_output()
 
-                if 'exec_failed' in filters and action_exec.return_code != 0:
-                    skip = False
+            self._handle_result(action_output, action_exec, progress, filters=filters)
 
-                if 'condition_ok' in filters and action_exec.passed_condition:
-                    skip = False
+            return action_exec
 
-                if 'condition_failed' in filters and not action_exec.passed_condition:
-                    skip = False
+    # output is spooled when only needed for filtered results, and not even read when no result needs it
+    def _output_mode(self) -> str:
+        if self._output_filters is None:
+            return OUTPUT_CAPTURE
 
-                if skip:
-                    return
-            
-            action_output.print_info(action_exec)
\ No newline at end of file
+        return OUTPUT_SPOOL if self._output_filters else OUTPUT_DISCARD
+
+    # handle the result of an action, executed directly or by a relay
+    def _handle_result(self, action_output: ActionOutput, action_exec: ActionExec, progress, *, filters: list = None) -> None:
+        # in watch mode, unchanged results are neither saved nor reported
+        if self._watch_results is not None and not self._watch_changed(action_output, action_exec):
+            return
+
+        if self._history:
+            self._history.record(action_output.host.host, action_output.action.type, action_output.action.name, action_exec)
+
+        if self._summary:
+            self._summary.add(action_output.host.host, action_exec)
+            return
+
+        if filters and not self._match_filters(filters, action_exec):
+            return
+
+        progress.write_result(action_output, action_exec)
+
+    def _match_filters(self, filters: list, action_exec: ActionExec) -> bool:
+        if 'exec_ok' in filters and action_exec.return_code == 0:
+            return True
+
+        if 'exec_failed' in filters and action_exec.return_code != 0:
+            return True
+
+        if 'condition_ok' in filters and action_exec.passed_condition:
+            return True
+
+        if 'condition_failed' in filters and not action_exec.passed_condition:
+            return True
+
+        return False
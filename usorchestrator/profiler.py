@@ -0,0 +1,214 @@
+import os
+import io
+import sys
+import time
+import signal
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from collections import defaultdict
+from usorchestrator.remote_cmd import spawn_stats
+
+__all__ = ['Profiler']
+
+"""
+Self-profiling of the orchestrator process.
+
+"cpu" mode profiles the main thread and every orchestration job with cProfile, "mem" mode
+traces allocations with tracemalloc. Both report the spawned processes count.
+
+Collection can be toggled at any time with SIGUSR1, so profiling can be armed in production
+(with on_demand, collection starts only on the first signal) and enabled for short windows.
+"""
+
+PROFILE_TOP_ENTRIES = 30
+MEM_TRACE_FRAMES = 1
+
+class Profiler:
+    def __init__(self, mode: str, *, output: str = None, on_demand: bool = False) -> None:
+        if mode not in ('cpu', 'mem'):
+            raise ValueError(f'Unknown profile mode "{mode}"')
+
+        self._mode: str = mode
+        self._output: str = output or f'usorchestrator-profile-{os.getpid()}.txt'
+        self._on_demand: bool = on_demand
+
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._lock: threading.Lock = threading.Lock()
+        self._active: bool = False
+        self._stopped: bool = False
+        self._collected: float = 0.0
+        self._activated_at: float = None
+        self._spawn_stats_start: dict = {}
+        self._spawn_stats: dict = {}
+
+        self._main_profile: cProfile.Profile = None
+        self._stats: pstats.Stats = None
+        self._snapshot: tracemalloc.Snapshot = None
+        self._peak_memory: int = 0
+
+    @property
+    def output(self) -> str:
+        return self._output
+
+    def start(self) -> None:
+        if threading.current_thread() is threading.main_thread() and hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.toggle())
+
+        if not self._on_demand:
+            self._activate()
+
+    def toggle(self) -> None:
+        if self._active:
+            self._deactivate()
+        else:
+            self._activate()
+
+    def stop(self) -> None:
+        if self._stopped:
+            return
+
+        self._stopped = True
+
+        if self._active:
+            self._deactivate()
+
+        with open(self._output, 'w') as f:
+            f.write(self._gen_report())
+
+        self._logger.info(f'Profile report written to "{self._output}"')
+
+    # wrap a function executed in worker threads, profiling it while collection is active
+    def wrap(self, func):
+        if self._mode != 'cpu':
+            return func
+
+        def wrapper(*args, **kwargs):
+            if not self._active:
+                return func(*args, **kwargs)
+
+            profile = cProfile.Profile()
+
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is active in this thread or process
+                return func(*args, **kwargs)
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._add_profile(profile)
+
+        return wrapper
+
+    def _activate(self) -> None:
+        self._activated_at = time.monotonic()
+        self._spawn_stats_start = spawn_stats()
+
+        if self._mode == 'cpu':
+            self._main_profile = cProfile.Profile()
+            self._main_profile.enable()
+        else:
+            tracemalloc.start(MEM_TRACE_FRAMES)
+
+        self._active = True
+        self._logger.info(f'Profiling ({self._mode}) activated')
+
+    def _deactivate(self) -> None:
+        self._active = False
+
+        if self._mode == 'cpu':
+            self._main_profile.disable()
+            self._add_profile(self._main_profile)
+        else:
+            # only the last collection window is kept for memory profiling
+            self._snapshot = tracemalloc.take_snapshot()
+            self._peak_memory = max(self._peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        self._collected += time.monotonic() - self._activated_at
+        self._add_spawn_stats(self._spawn_stats_start, spawn_stats())
+        self._logger.info(f'Profiling ({self._mode}) deactivated')
+
+    def _add_profile(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile, stream=io.StringIO())
+            else:
+                self._stats.add(profile)
+
+    # add spawned processes of the collection window
+    def _add_spawn_stats(self, start: dict, end: dict) -> None:
+        for (protocol, (count, duration)) in end.items():
+            (start_count, start_duration) = start.get(protocol, (0, 0.0))
+            (total_count, total_duration) = self._spawn_stats.get(protocol, (0, 0.0))
+
+            self._spawn_stats[protocol] = (total_count + count - start_count, total_duration + duration - start_duration)
+
+    def _gen_report(self) -> str:
+        report = io.StringIO()
+
+        report.write(f'Profile mode: {self._mode}\n')
+        report.write(f'Collected for: {self._collected:.2f}s\n\n')
+
+        report.write('Spawned processes (protocol, count, total seconds):\n')
+        for (protocol, (count, duration)) in sorted(self._spawn_stats.items()):
+            report.write(f'    {protocol:<12} {count:>8} {duration:>12.2f}\n')
+        report.write('\n')
+
+        if self._mode == 'cpu':
+            self._gen_cpu_report(report)
+        else:
+            self._gen_mem_report(report)
+
+        return report.getvalue()
+
+    def _gen_cpu_report(self, report: io.StringIO) -> None:
+        if self._stats is None:
+            report.write('No CPU profile collected\n')
+            return
+
+        self._stats.stream = report
+
+        report.write('Top functions by cumulative time:\n')
+        self._stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_ENTRIES)
+
+        report.write('Top functions by own time:\n')
+        self._stats.sort_stats(pstats.SortKey.TIME).print_stats(PROFILE_TOP_ENTRIES)
+
+    def _gen_mem_report(self, report: io.StringIO) -> None:
+        if self._snapshot is None:
+            report.write('No memory profile collected\n')
+            return
+
+        report.write(f'Peak traced memory: {self._peak_memory / 1024:.1f} KiB\n\n')
+
+        # aggregate allocations by module
+        modules = defaultdict(lambda: [0, 0])
+
+        for stat in self._snapshot.statistics('filename'):
+            module = self._module_name(stat.traceback[0].filename)
+            modules[module][0] += stat.size
+            modules[module][1] += stat.count
+
+        report.write('Top allocations by module (KiB, blocks):\n')
+        for (module, (size, count)) in sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:PROFILE_TOP_ENTRIES]:
+            report.write(f'    {size / 1024:>10.1f} {count:>10} {module}\n')
+        report.write('\n')
+
+        report.write('Top allocations by line (KiB, blocks):\n')
+        for stat in self._snapshot.statistics('lineno')[:PROFILE_TOP_ENTRIES]:
+            frame = stat.traceback[0]
+            report.write(f'    {stat.size / 1024:>10.1f} {stat.count:>10} {frame.filename}:{frame.lineno}\n')
+
+    def _module_name(self, filename: str) -> str:
+        # match the longest sys.path entry containing the file
+        for path in sorted(filter(None, sys.path), key=len, reverse=True):
+            if filename.startswith(path + os.sep):
+                return os.path.splitext(os.path.relpath(filename, path))[0].replace(os.sep, '.')
+
+        return filename
@@ -0,0 +1,161 @@
+import sys
+import time
+import queue
+import shutil
+import logging
+import itertools
+import threading
+
+__all__ = ['ProgressRenderer']
+
+"""
+Progress rendering is decoupled from the workers executing the actions.
+Workers only push events into a queue, while a single renderer thread owns
+the terminal, redrawing a compact status line at a fixed frame rate.
+
+When the output stream is not a TTY, no status line is drawn, results are
+written as they come and progress is reported through logging instead.
+"""
+
+class ProgressRenderer:
+    def __init__(self, total: int, *, stream=None, fps: int = 10, slowest: int = 3, log_interval: int = 5) -> None:
+        self._total: int = total
+        self._stream = stream or sys.stdout
+        self._tty: bool = self._stream.isatty()
+        self._frame_interval: float = 1 / fps
+        self._log_interval: int = log_interval
+        self._slowest: int = slowest
+
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: threading.Thread = threading.Thread(target=self._run, name='usorchestrator-progress', daemon=True)
+        self._task_ids = itertools.count()
+
+        self._running: dict = {}
+        self._done: int = 0
+        self._failed: int = 0
+        self._started_at: float = None
+        self._drawn: str = ''
+
+    def start(self) -> None:
+        self._started_at = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def task_started(self, label: str) -> int:
+        task_id = next(self._task_ids)
+        self._queue.put(('start', task_id, label, time.monotonic()))
+
+        return task_id
+
+    def task_finished(self, task_id: int, failed: bool = False) -> None:
+        self._queue.put(('finish', task_id, failed))
+
+    # adjust the expected number of tasks, once known
+    def add_total(self, count: int) -> None:
+        self._queue.put(('total', count))
+
+    def write(self, text: str) -> None:
+        self._queue.put(('write', text))
+
+    def write_result(self, action_output, action_exec) -> None:
+        self.write(action_output.format_info(action_exec))
+
+    def _run(self) -> None:
+        last_draw = 0.0
+        last_log = time.monotonic()
+        stopped = False
+
+        while not stopped:
+            try:
+                events = [self._queue.get(timeout=self._frame_interval)]
+            except queue.Empty:
+                events = []
+
+            # drain everything queued since the last frame
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for event in events:
+                if event is None:
+                    stopped = True
+                    continue
+
+                self._handle_event(event)
+
+            now = time.monotonic()
+
+            if self._tty:
+                if not stopped and now - last_draw >= self._frame_interval:
+                    self._draw(now)
+                    last_draw = now
+            elif now - last_log >= self._log_interval:
+                self._logger.info(self._status_line(now))
+                last_log = now
+
+        self._clear()
+        self._stream.flush()
+
+    def _handle_event(self, event: tuple) -> None:
+        if event[0] == 'start':
+            (_, task_id, label, started_at) = event
+            self._running[task_id] = (label, started_at)
+        elif event[0] == 'finish':
+            (_, task_id, failed) = event
+            self._running.pop(task_id, None)
+            self._done += 1
+
+            if failed:
+                self._failed += 1
+        elif event[0] == 'total':
+            self._total += event[1]
+        elif event[0] == 'write':
+            self._clear()
+            self._stream.write(event[1])
+
+    def _draw(self, now: float) -> None:
+        width = shutil.get_terminal_size().columns
+        line = self._status_line(now)[:max(width - 1, 0)]
+
+        # skip terminal writes if nothing changed since the last frame
+        if line == self._drawn:
+            return
+
+        self._stream.write('\r\033[K' + line)
+        self._stream.flush()
+        self._drawn = line
+
+    def _clear(self) -> None:
+        if not self._drawn:
+            return
+
+        self._stream.write('\r\033[K')
+        self._drawn = ''
+
+    def _status_line(self, now: float) -> str:
+        status = f'● {len(self._running)} running, {self._done}/{self._total} done, {self._failed} failed'
+
+        if self._done:
+            remaining = self._total - self._done
+            eta = (now - self._started_at) / self._done * remaining
+            status += f', ETA {self._format_duration(eta)}'
+
+        if self._running:
+            slowest = sorted(self._running.values(), key=lambda task: task[1])[:self._slowest]
+            status += ' | slowest: ' + ', '.join(f'{label} ({self._format_duration(now - started_at)})' for (label, started_at) in slowest)
+
+        return status
+
+    def _format_duration(self, seconds: float) -> str:
+        seconds = int(seconds)
+
+        if seconds < 60:
+            return f'{seconds}s'
+
+        return f'{seconds // 60}m{seconds % 60:02d}s'
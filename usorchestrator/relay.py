@@ -0,0 +1,192 @@
+import sys
+import json
+import logging
+import tempfile
+import itertools
+import threading
+import subprocess
+from usorchestrator.remote import Remote, REMOTE_PATTERN
+from usorchestrator.action import Action
+from usorchestrator.action_exec import ActionExec
+from usorchestrator.action_output import ActionOutput
+from usorchestrator.remote_cmd import remote_popen
+
+__all__ = ['Relay', 'RelayProgress']
+
+"""
+Hosts groups can be delegated to a relay host (ex: a bastion in a remote site).
+
+The orchestrator starts "<relay_command> worker" on the relay and sends it, in a single
+JSON document on stdin, the group's hosts and the compiled actions. The worker orchestrates
+the hosts locally and streams back JSON lines events:
+    - {"event": "start", "task": <id>, "label": <label>}
+    - {"event": "finish", "task": <id>, "failed": <bool>}
+    - {"event": "total", "count": <count>}
+    - {"event": "result", "host": <index>, "action": <index>, "stdout": [...], "stderr": [...], "return_code": <int>, "passed_condition": <bool>, "started_at": <timestamp>, "duration": <seconds>, "output_discarded": <bool>}
+    - {"event": "write", "text": <text>}
+"""
+
+RELAY_DEFAULT_COMMAND = 'usorchestrator'
+
+class Relay:
+    def __init__(self, relay: str, hosts: list[str], command: str = None) -> None:
+        self._remote: Remote = Remote(relay)
+        self._raw_hosts: list[str] = hosts
+        self._command: str = command or RELAY_DEFAULT_COMMAND
+        self._limits: dict[str, int] = {}
+
+        self._logger: logging.Logger = logging.getLogger(__name__)
+
+        # hosts are parsed by the worker, only validate them here
+        for host in hosts:
+            if not REMOTE_PATTERN.match(host):
+                raise ValueError(f'Invalid remote string "{host}"')
+
+    @property
+    def remote(self) -> Remote:
+        return self._remote
+
+    @property
+    def raw_hosts(self) -> list[str]:
+        return self._raw_hosts
+
+    @property
+    def command(self) -> str:
+        return self._command
+
+    # share of the resource limits given to the relay
+    @property
+    def limits(self) -> dict[str, int]:
+        return self._limits
+
+    def setLimits(self, limits: dict[str, int]) -> None:
+        self._limits = limits
+
+    def run(self, actions: list[Action], progress, result_handler, *, data: dict = None, concurrency: int = 1, body_concurrency: int = None, output_filters: list = None) -> None:
+        payload = json.dumps({
+            'hosts': self._raw_hosts,
+            'actions': [action.toDict() for action in actions],
+            'data': data or {},
+            'concurrency': concurrency,
+            'body_concurrency': body_concurrency,
+            'limits': self._limits,
+            # results not matching the filters are sent back without output
+            'output_filters': output_filters,
+        }).encode('utf-8')
+
+        relay = self._remote
+        tasks = {}
+
+        self._logger.debug(f'Delegating hosts "{self._raw_hosts}" to relay "{relay.host}"')
+
+        with tempfile.TemporaryFile() as stderr:
+            try:
+                proc = remote_popen('ssh-bash', (f'{self._command} worker',), relay.local, relay.host, relay.user, relay.port, relay.password, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+            except OSError as e:
+                progress.write(f'ERROR: Could not start relay "{relay.host}": {e}\n')
+                self._logger.exception(e, exc_info=True)
+                return
+
+            try:
+                # worker reads the whole payload before producing any output
+                try:
+                    proc.stdin.write(payload)
+                    proc.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+                for line in proc.stdout:
+                    self._handle_message(line, actions, progress, result_handler, tasks)
+
+                return_code = proc.wait()
+            finally:
+                if proc.poll() is None:
+                    proc.kill()
+                    proc.wait()
+
+            # tasks not reported as finished by the worker are failed
+            for task_id in tasks.values():
+                progress.task_finished(task_id, failed=True)
+
+            if return_code != 0:
+                stderr.seek(0)
+                error = stderr.read().decode('utf-8', errors='replace').strip()
+
+                progress.write(f'ERROR: Relay "{relay.host}" failed with return code {return_code}' + (f':\n{error}' if error else '') + '\n')
+                self._logger.error(f'Relay "{relay.host}" failed with return code {return_code}: {error}')
+
+    def _handle_message(self, line: bytes, actions: list[Action], progress, result_handler, tasks: dict) -> None:
+        try:
+            message = json.loads(line)
+        except ValueError:
+            # pass through anything that isn't an event
+            progress.write(line.decode('utf-8', errors='replace'))
+            return
+
+        if message['event'] == 'start':
+            tasks[message['task']] = progress.task_started(f'{message["label"]} (via {self._remote.host})')
+        elif message['event'] == 'finish':
+            progress.task_finished(tasks.pop(message['task']), failed=message['failed'])
+        elif message['event'] == 'total':
+            progress.add_total(message['count'])
+        elif message['event'] == 'result':
+            action_output = ActionOutput(actions[message['action']], Remote(self._raw_hosts[message['host']]))
+            stdout = [output.encode('utf-8') for output in message['stdout']]
+            stderr = [output.encode('utf-8') for output in message['stderr']]
+            action_exec = ActionExec(stdout=stdout, stderr=stderr, return_code=message['return_code'], passed_condition=message['passed_condition'], started_at=message['started_at'], duration=message['duration'], output_discarded=message.get('output_discarded', False))
+
+            result_handler(action_output, action_exec)
+        elif message['event'] == 'write':
+            progress.write(message['text'])
+
+# progress implementation used by relay workers, streaming events back to the orchestrator
+class RelayProgress:
+    def __init__(self, hosts: list[Remote], actions: list[Action], *, stream=None) -> None:
+        self._stream = stream or sys.stdout
+        self._lock: threading.Lock = threading.Lock()
+        self._task_ids = itertools.count()
+
+        self._hosts_index: dict[int, int] = {id(host): i for (i, host) in enumerate(hosts)}
+        self._actions_index: dict[int, int] = {id(action): i for (i, action) in enumerate(actions)}
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        self._stream.flush()
+
+    def task_started(self, label: str) -> int:
+        task_id = next(self._task_ids)
+        self._send({'event': 'start', 'task': task_id, 'label': label})
+
+        return task_id
+
+    def task_finished(self, task_id: int, failed: bool = False) -> None:
+        self._send({'event': 'finish', 'task': task_id, 'failed': failed})
+
+    def add_total(self, count: int) -> None:
+        self._send({'event': 'total', 'count': count})
+
+    def write(self, text: str) -> None:
+        self._send({'event': 'write', 'text': text})
+
+    def write_result(self, action_output: ActionOutput, action_exec: ActionExec) -> None:
+        self._send({
+            'event': 'result',
+            'host': self._hosts_index[id(action_output.host)],
+            'action': self._actions_index[id(action_output.action)],
+            'stdout': action_exec.stdout,
+            'stderr': action_exec.stderr,
+            'return_code': action_exec.return_code,
+            'passed_condition': action_exec.passed_condition,
+            'started_at': action_exec.started_at,
+            'duration': action_exec.duration,
+            'output_discarded': action_exec.output_discarded,
+        })
+
+    def _send(self, message: dict) -> None:
+        line = json.dumps(message) + '\n'
+
+        with self._lock:
+            self._stream.write(line)
+            self._stream.flush()
@@ -1,7 +1,9 @@
+import sys
 import socket
 import re
+from functools import lru_cache
 
-__all__ = ['Remote']
+__all__ = ['Remote', 'REMOTE_PATTERN']
 
 """
 Allwed host formats:
@@ -17,7 +19,12 @@ Allwed host formats:
 Note: Using the password is not recommended, as it will be visible in the process list.
 """
 
+REMOTE_PATTERN = re.compile(r'^(?:(?P<username>[^@]+)@)?(?P<hostname>[^:/]+)(?::(?P<port>\d+))?(?:/(?P<password>.+))?$')
+
 class Remote:
+    # slotted, as inventories can contain a large number of hosts
+    __slots__ = ('_host', '_user', '_port', '_password', '_local')
+
     def __init__(self, remote: str) -> None:
         self._host: str = None
         self._user: str
@@ -25,19 +32,18 @@ class Remote:
         self._password: str
         self._local: bool
    
-        pattern = r'^(?:(?P<username>[^@]+)@)?(?P<hostname>[^:/]+)(?::(?P<port>\d+))?(?:/(?P<password>.+))?$'
-
-        match = re.match(pattern, remote)
+        match = REMOTE_PATTERN.match(remote)
 
         if not match:
             raise ValueError('Invalid remote string')
 
-        self._host = match.group('hostname')
-        self._user = match.group('username') or 'root'
-        self._port = match.group('port') or 22
+        # host names and users repeat across runs and actions, share a single copy
+        self._host = sys.intern(match.group('hostname'))
+        self._user = sys.intern(match.group('username') or 'root')
+        self._port = int(match.group('port') or 22)
         self._password = match.group('password') or ''
 
-        self._local = True if (self._host == socket.gethostname() or self._host == 'localhost') else False
+        self._local = True if (self._host == local_hostname() or self._host == 'localhost') else False
     
     @property
     def host(self) -> str:
@@ -58,9 +64,16 @@ class Remote:
     @property
     def local(self) -> bool:
         return self._local
+
+    def setLocal(self, local: bool) -> None:
+        self._local = local
     
     def __str__(self) -> str:
         return f"{self._user}@{self._host}"
 
     def __bool__(self) -> bool:
         return self._host is not None
+
+@lru_cache(maxsize=None)
+def local_hostname() -> str:
+    return socket.gethostname()
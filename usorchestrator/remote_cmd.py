@@ -1,8 +1,102 @@
+import os
+import glob
+import time
+import tempfile
 import subprocess
 import shlex
+import threading
 from usorchestrator.exceptions import RemoteCmdError
+from usorchestrator.spooled_output import SpooledOutput
 
-def remote_cmd(protocol: str, action: tuple[str], local:bool, host:str = '', user:str = 'root', port:int = 22, password: str = None) -> dict:
+__all__ = ['OUTPUT_CAPTURE', 'OUTPUT_SPOOL', 'OUTPUT_DISCARD', 'remote_cmd', 'remote_popen', 'spawn_stats', 'enable_ssh_multiplexing', 'disable_ssh_multiplexing']
+
+# spawned processes count and total duration by protocol
+_spawn_stats: dict[str, tuple] = {}
+_spawn_stats_lock = threading.Lock()
+
+# ssh connections sharing options, if enabled
+_ssh_multiplexing: dict = None
+
+# output modes: read into memory, spooled to temporary files (read later, if needed) or discarded
+OUTPUT_CAPTURE = 'capture'
+OUTPUT_SPOOL = 'spool'
+OUTPUT_DISCARD = 'discard'
+
+# input can be bytes or a file, read directly by the command
+def remote_cmd(protocol: str, action: tuple[str], local:bool, host:str = '', user:str = 'root', port:int = 22, password: str = None, input = None, output_mode: str = OUTPUT_CAPTURE) -> dict:
+    command_to_run = _gen_command(protocol, action, local, host, user, port, password)
+
+    if output_mode == OUTPUT_SPOOL:
+        (stdout, stderr) = (tempfile.TemporaryFile(), tempfile.TemporaryFile())
+    elif output_mode == OUTPUT_DISCARD:
+        (stdout, stderr) = (subprocess.DEVNULL, subprocess.DEVNULL)
+    else:
+        (stdout, stderr) = (subprocess.PIPE, subprocess.PIPE)
+
+    started_at = time.monotonic()
+
+    if input is None:
+        cmd = subprocess.run(command_to_run, stdin=subprocess.DEVNULL, stdout=stdout, stderr=stderr)
+    elif hasattr(input, 'fileno'):
+        cmd = subprocess.run(command_to_run, stdin=input, stdout=stdout, stderr=stderr)
+    else:
+        cmd = subprocess.run(command_to_run, input=input, stdout=stdout, stderr=stderr)
+
+    _add_spawn_stats(protocol, time.monotonic() - started_at)
+
+    if output_mode == OUTPUT_SPOOL:
+        (stdout, stderr) = (SpooledOutput(stdout), SpooledOutput(stderr))
+    elif output_mode == OUTPUT_DISCARD:
+        (stdout, stderr) = (b'', b'')
+    else:
+        (stdout, stderr) = (cmd.stdout.strip(), cmd.stderr.strip())
+
+    ret = {
+        'stdout': stdout,
+        'stderr': stderr,
+        'return_code': cmd.returncode
+    }
+
+    return ret
+
+# start the command without waiting for it, streams being handled by the caller
+def remote_popen(protocol: str, action: tuple[str], local:bool, host:str = '', user:str = 'root', port:int = 22, password: str = None, **popen_args) -> subprocess.Popen:
+    command_to_run = _gen_command(protocol, action, local, host, user, port, password)
+    _add_spawn_stats(protocol, 0.0)
+
+    return subprocess.Popen(command_to_run, **popen_args)
+
+# keep ssh connections open between commands, sharing them for all commands to the same host
+def enable_ssh_multiplexing(control_dir: str, persist: int) -> None:
+    global _ssh_multiplexing
+
+    _ssh_multiplexing = {
+        'control_dir': control_dir,
+        'options': ['-o', 'ControlMaster=auto', '-o', f'ControlPath={control_dir}/%C', '-o', f'ControlPersist={persist}'],
+    }
+
+# close all the shared connections
+def disable_ssh_multiplexing() -> None:
+    global _ssh_multiplexing
+
+    if _ssh_multiplexing is None:
+        return
+
+    for control_path in glob.glob(os.path.join(_ssh_multiplexing['control_dir'], '*')):
+        subprocess.run(['ssh', '-o', f'ControlPath={control_path}', '-O', 'exit', 'usorchestrator'], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    _ssh_multiplexing = None
+
+def spawn_stats() -> dict[str, tuple]:
+    with _spawn_stats_lock:
+        return dict(_spawn_stats)
+
+def _add_spawn_stats(protocol: str, duration: float) -> None:
+    with _spawn_stats_lock:
+        (count, total_duration) = _spawn_stats.get(protocol, (0, 0.0))
+        _spawn_stats[protocol] = (count + 1, total_duration + duration)
+
+def _gen_command(protocol: str, action: tuple[str], local:bool, host:str, user:str, port:int, password: str) -> list[str]:
     remote_cmd_prefix = []
     ssh_opts = []
 
@@ -11,6 +105,9 @@ def remote_cmd(protocol: str, action: tuple[str], local:bool, host:str = '', use
     else:
         ssh_opts += ['-o', 'PasswordAuthentication=No', '-o', 'BatchMode=yes']
 
+    if _ssh_multiplexing is not None:
+        ssh_opts += _ssh_multiplexing['options']
+
     if protocol == 'ssh-bash':
         bash_command = ['bash', '-c', action[0]]
         bash_command_quoted = ' '.join(shlex.quote(c) for c in bash_command)
@@ -32,12 +129,4 @@ def remote_cmd(protocol: str, action: tuple[str], local:bool, host:str = '', use
     else:
         raise RemoteCmdError('Unknown protocol provided')
 
-    cmd = subprocess.run(command_to_run, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-
-    ret = {
-        'stdout': cmd.stdout.decode('utf-8').strip(),
-        'stderr': cmd.stderr.decode('utf-8').strip(),
-        'return_code': cmd.returncode
-    }
-
-    return ret
\ No newline at end of file
+    return command_to_run
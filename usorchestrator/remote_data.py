@@ -0,0 +1,64 @@
+import functools
+
+__all__ = ['RemoteData', 'DATA_STREAM_THRESHOLD']
+
+"""
+Large variables values are not embedded in the command line. They are streamed once
+over the ssh session's stdin and written by the target host to a private temporary
+directory, removed when the command exits.
+
+Each streamed value is exposed to the command as a "<name>_file" variable holding the
+file path, and as the "<name>" variable itself (trailing newlines are stripped, as
+with command substitution).
+"""
+
+DATA_STREAM_THRESHOLD = 4096
+DATA_DIR_VARIABLE = '__usorchestrator_data'
+
+class RemoteData:
+    def __init__(self) -> None:
+        self._values: dict[str, str] = {}
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._values)
+
+    # only large values are streamed, small ones are cheaper inline
+    def accepts(self, value: str) -> bool:
+        return len(value) >= DATA_STREAM_THRESHOLD
+
+    def add(self, name: str, value: str) -> None:
+        self._values[name] = value
+
+    # values are expected on stdin, in the order they were added
+    def gen_read(self) -> str:
+        if not self._values:
+            return ''
+
+        (_, sizes) = _encode_values(tuple(self._values.values()))
+
+        cmd_parts = []
+
+        cmd_parts.append(f'{DATA_DIR_VARIABLE}=$(mktemp -d)')
+        cmd_parts.append(f'trap \'rm -rf "${DATA_DIR_VARIABLE}"\' EXIT')
+
+        for (name, size) in zip(self._values, sizes):
+            cmd_parts.append(f'{name}_file="${DATA_DIR_VARIABLE}/{name}"')
+            cmd_parts.append(f'head -c {size} > "${name}_file"')
+            cmd_parts.append(f'{name}=$(< "${name}_file")')
+
+        return '\n'.join(cmd_parts)
+
+    @property
+    def input(self) -> bytes:
+        if not self._values:
+            return None
+
+        return _encode_values(tuple(self._values.values()))[0]
+
+# the same values are sent to every host, encode them only once
+@functools.lru_cache(maxsize=8)
+def _encode_values(values: tuple[str]) -> tuple[bytes, tuple[int]]:
+    encoded_values = [value.encode('utf-8') for value in values]
+
+    return (b''.join(encoded_values), tuple(len(encoded_value) for encoded_value in encoded_values))
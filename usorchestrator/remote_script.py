@@ -0,0 +1,74 @@
+import hashlib
+from usorchestrator.spooled_output import read_output
+
+__all__ = ['RemoteScript']
+
+"""
+Large scripts are uploaded once to a content addressed path on the target host
+and executed from there on later runs, so only the variables preamble needs to be
+sent with every command.
+
+Cached scripts are touched on each execution. On every upload, scripts not used
+in the last SCRIPT_CACHE_MAX_AGE days are evicted, as well as the least recently
+used ones above SCRIPT_CACHE_MAX_ENTRIES.
+"""
+
+SCRIPT_CACHE_DIR = '"$HOME/.cache/usorchestrator/scripts"'
+SCRIPT_CACHE_THRESHOLD = 1024
+SCRIPT_CACHE_MAX_AGE = 30
+SCRIPT_CACHE_MAX_ENTRIES = 200
+
+CACHE_MISS_CODE = 199
+CACHE_MISS_MARKER = '__usorchestrator_script_cache_miss__'
+
+class RemoteScript:
+    def __init__(self, script: str) -> None:
+        self._script: str = script
+        self._hash: str = hashlib.sha256(script.encode('utf-8')).hexdigest()
+
+    @property
+    def script(self) -> str:
+        return self._script
+
+    @property
+    def hash(self) -> str:
+        return self._hash
+
+    @property
+    def path(self) -> str:
+        return f'{SCRIPT_CACHE_DIR}/{self._hash}.sh'
+
+    def gen_exec(self, preamble: str) -> str:
+        cmd_parts = [preamble]
+
+        cmd_parts.append(f'__usorchestrator_script={self.path}')
+        cmd_parts.append(f'[ -r "$__usorchestrator_script" ] || {{ echo >&2 "{CACHE_MISS_MARKER}"; exit {CACHE_MISS_CODE}; }}')
+        # refresh script mtime, used for eviction
+        cmd_parts.append('touch "$__usorchestrator_script" > /dev/null 2>&1 || true')
+        cmd_parts.append('. "$__usorchestrator_script"')
+
+        return '\n'.join(cmd_parts)
+
+    # script content is expected on stdin
+    def gen_upload(self) -> str:
+        cmd_parts = ['set -e', 'umask 077']
+
+        cmd_parts.append(f'mkdir -p {SCRIPT_CACHE_DIR}')
+        cmd_parts.append(f'__usorchestrator_tmp=$(mktemp {SCRIPT_CACHE_DIR}/.upload.XXXXXX)')
+        cmd_parts.append('cat > "$__usorchestrator_tmp"')
+        cmd_parts.append(f'mv -f "$__usorchestrator_tmp" {self.path}')
+
+        # evict expired and least recently used scripts
+        cmd_parts.append(f'find {SCRIPT_CACHE_DIR} -type f -name "*.sh" -mtime +{SCRIPT_CACHE_MAX_AGE} -exec rm -f {{}} + || true')
+        cmd_parts.append(f'ls -1t {SCRIPT_CACHE_DIR} | grep "\\.sh$" | tail -n +{SCRIPT_CACHE_MAX_ENTRIES + 1} | while read -r f; do rm -f {SCRIPT_CACHE_DIR}/"$f"; done')
+
+        return '\n'.join(cmd_parts)
+
+    # stderr is only read (replaced by its content if spooled) for the cache miss return code
+    def is_cache_miss(self, output: dict) -> bool:
+        if output['return_code'] != CACHE_MISS_CODE:
+            return False
+
+        output['stderr'] = read_output(output['stderr'])
+
+        return CACHE_MISS_MARKER.encode('utf-8') in output['stderr'].splitlines()
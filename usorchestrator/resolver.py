@@ -0,0 +1,167 @@
+import os
+import time
+import getpass
+import socket
+import struct
+import logging
+import threading
+import ipaddress
+import itertools
+from typing import Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from usorchestrator.remote import Remote
+
+__all__ = ['Resolver']
+
+"""
+Detects hosts pointing to the orchestrator machine itself (by name, FQDN or any of the
+local interfaces addresses), resolving hosts names concurrently before orchestration and
+caching the locality of each name for RESOLVE_TTL seconds (RESOLVE_NEGATIVE_TTL for failures).
+
+Only hosts reached on the default ssh port, as the orchestrator's own user, can be local:
+other ports (ex: forwarded to a VM or container) and other users still go through ssh, so
+their names are not resolved. ssh resolves the names again when connecting (applying
+ssh_config), so this doesn't save the DNS lookup of each ssh spawn.
+"""
+
+RESOLVE_TTL = 300
+RESOLVE_NEGATIVE_TTL = 30
+RESOLVE_CONCURRENCY = 32
+RESOLVE_BATCH_SIZE = 256
+
+# ioctl request for reading an interface IPv4 address (linux)
+SIOCGIFADDR = 0x8915
+
+class Resolver:
+    def __init__(self) -> None:
+        self._logger: logging.Logger = logging.getLogger(__name__)
+        # name: (local, expires)
+        self._cache: dict[str, tuple] = {}
+        self._lock: threading.Lock = threading.Lock()
+        self._local_addresses: set[str] = None
+        self._local_user: str = None
+
+    def resolve(self, hosts: list[Remote]) -> None:
+        for _ in self.resolve_iter(hosts):
+            pass
+
+    # resolve hosts in batches, as they are consumed
+    def resolve_iter(self, hosts: Iterable[Remote]) -> Iterator[Remote]:
+        hosts = iter(hosts)
+
+        with ThreadPoolExecutor(max_workers=RESOLVE_CONCURRENCY, thread_name_prefix='usorchestrator-resolver') as executor:
+            while True:
+                batch = list(itertools.islice(hosts, RESOLVE_BATCH_SIZE))
+
+                if not batch:
+                    break
+
+                candidates = [host for host in batch if self._may_be_local(host)]
+                names = {host.host for host in candidates}
+                local_names = dict(zip(names, executor.map(self._resolve_local, names)))
+
+                for host in candidates:
+                    if local_names[host.host]:
+                        host.setLocal(True)
+
+                yield from batch
+
+    def _may_be_local(self, host: Remote) -> bool:
+        return not host.local and host.port == 22 and host.user == self.local_user()
+
+    def local_user(self) -> str:
+        if self._local_user is None:
+            self._local_user = getpass.getuser()
+
+        return self._local_user
+
+    def local_addresses(self) -> set[str]:
+        if self._local_addresses is None:
+            self._local_addresses = self._discover_local_addresses()
+
+        return self._local_addresses
+
+    def _is_local(self, address: str) -> bool:
+        if address in self.local_addresses():
+            return True
+
+        try:
+            return ipaddress.ip_address(address).is_loopback
+        except ValueError:
+            return False
+
+    # check if the name resolves to the orchestrator machine
+    def _resolve_local(self, name: str) -> bool:
+        now = time.monotonic()
+
+        with self._lock:
+            cached = self._cache.get(name)
+
+        if cached and cached[1] > now:
+            return cached[0]
+
+        try:
+            # addresses are returned in the system's preference order, as used by ssh
+            address = socket.getaddrinfo(name, None, type=socket.SOCK_STREAM)[0][4][0]
+            local = self._is_local(address)
+            expires = now + RESOLVE_TTL
+        except (socket.gaierror, UnicodeError) as e:
+            self._logger.debug(f'Could not resolve "{name}": {e}')
+            local = False
+            expires = now + RESOLVE_NEGATIVE_TTL
+
+        with self._lock:
+            self._cache[name] = (local, expires)
+
+        return local
+
+    def _discover_local_addresses(self) -> set[str]:
+        addresses = {'127.0.0.1', '::1'}
+
+        # addresses of the local hostname
+        for name in (socket.gethostname(), socket.getfqdn()):
+            try:
+                addresses.update(info[4][0] for info in socket.getaddrinfo(name, None, type=socket.SOCK_STREAM))
+            except (socket.gaierror, UnicodeError):
+                pass
+
+        addresses.update(self._interfaces_ipv4_addresses())
+        addresses.update(self._interfaces_ipv6_addresses())
+
+        self._logger.debug(f'Discovered local addresses: "{sorted(addresses)}"')
+
+        return addresses
+
+    def _interfaces_ipv4_addresses(self) -> set[str]:
+        addresses = set()
+
+        try:
+            import fcntl
+            interfaces = socket.if_nameindex()
+        except (ImportError, OSError):
+            return addresses
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for (_, interface) in interfaces:
+                try:
+                    ifreq = fcntl.ioctl(sock.fileno(), SIOCGIFADDR, struct.pack('256s', interface.encode('utf-8')[:15]))
+                except OSError:
+                    # interface without an IPv4 address
+                    continue
+
+                addresses.add(socket.inet_ntoa(ifreq[20:24]))
+
+        return addresses
+
+    def _interfaces_ipv6_addresses(self) -> set[str]:
+        addresses = set()
+
+        if not os.path.exists('/proc/net/if_inet6'):
+            return addresses
+
+        with open('/proc/net/if_inet6') as f:
+            for line in f:
+                raw_address = line.split()[0]
+                addresses.add(str(ipaddress.IPv6Address(int(raw_address, 16))))
+
+        return addresses
@@ -0,0 +1,138 @@
+import os
+import threading
+from contextlib import contextmanager
+
+__all__ = ['ResourceLimits', 'ResourceLimit', 'acquire_limits']
+
+"""
+Named resource limits shared by all hosts (ex: "apt_mirror:20 local_cpu:auto").
+
+A limit defined by multiple routines with different sizes uses the smallest one.
+"auto" sizes the limit to the number of CPUs available to the machine executing the
+routine (the orchestrator, or the relay for delegated hosts groups).
+
+When hosts groups are delegated to relays, each fixed size limit is split between the
+orchestrator and the relays (each getting at least 1), so the total stays within the
+limit's size. Limits defined with "auto" (by any routine) are local to each machine and
+are not split.
+"""
+
+class ResourceLimit:
+    def __init__(self, name: str, size: int, auto: bool = False) -> None:
+        self._name: str = name
+        self._size: int = size
+        self._auto: bool = auto
+        # smallest fixed size defined by the routines, before taking a share of it
+        self._fixed_size: int = None if auto else size
+        self._semaphore: threading.BoundedSemaphore = None
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    # sized to the CPUs of the machine executing the routine
+    @property
+    def auto(self) -> bool:
+        return self._auto
+
+    # definitions sent to relays, "auto" being resolved by each relay
+    @property
+    def specs(self) -> list[str]:
+        specs = [f'{self._name}:auto'] if self._auto else []
+
+        if self._fixed_size is not None:
+            specs.append(f'{self._name}:{self._fixed_size}')
+
+        return specs
+
+    def restrict(self, size: int, auto: bool = False) -> None:
+        with self._lock:
+            if self._semaphore is not None:
+                raise ValueError(f'Limit "{self._name}" is already in use')
+
+            self._size = min(self._size, size)
+
+            if auto:
+                self._auto = True
+            else:
+                self._fixed_size = size if self._fixed_size is None else min(self._fixed_size, size)
+
+    # restrict the limit to the share of this machine, keeping its definition for the relays
+    def share(self, size: int) -> None:
+        with self._lock:
+            if self._semaphore is not None:
+                raise ValueError(f'Limit "{self._name}" is already in use')
+
+            self._size = min(self._size, size)
+
+    def acquire(self) -> None:
+        # semaphore is created on first use, after all routines defined their sizes
+        with self._lock:
+            if self._semaphore is None:
+                self._semaphore = threading.BoundedSemaphore(self._size)
+
+        self._semaphore.acquire()
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+class ResourceLimits:
+    def __init__(self) -> None:
+        self._limits: dict[str, ResourceLimit] = {}
+
+    @property
+    def limits(self) -> list[ResourceLimit]:
+        return list(self._limits.values())
+
+    def define(self, raw_limits: list[str]) -> list[ResourceLimit]:
+        limits = []
+
+        for raw_limit in raw_limits:
+            name, size, auto = self._parse_limit(raw_limit)
+
+            if name in self._limits:
+                self._limits[name].restrict(size, auto)
+            else:
+                self._limits[name] = ResourceLimit(name, size, auto)
+
+            limits.append(self._limits[name])
+
+        return limits
+
+    def _parse_limit(self, raw_limit: str) -> tuple[str, int, bool]:
+        try:
+            name, size = raw_limit.split(':', 1)
+        except ValueError:
+            raise ValueError(f'Invalid limit "{raw_limit}", expected format <name>:<size>')
+
+        if not name:
+            raise ValueError(f'Invalid limit "{raw_limit}", name is empty')
+
+        if size == 'auto':
+            return (name, len(os.sched_getaffinity(0)), True)
+
+        if not size.isdigit() or int(size) < 1:
+            raise ValueError(f'Invalid limit "{raw_limit}", size must be a positive number or "auto"')
+
+        return (name, int(size), False)
+
+@contextmanager
+def acquire_limits(limits: list[ResourceLimit]):
+    # acquire in a stable order to avoid deadlocks between routines sharing limits
+    limits = sorted(set(limits), key=lambda limit: limit.name)
+    acquired = []
+
+    try:
+        for limit in limits:
+            limit.acquire()
+            acquired.append(limit)
+
+        yield
+    finally:
+        for limit in reversed(acquired):
+            limit.release()
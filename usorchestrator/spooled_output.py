@@ -0,0 +1,29 @@
+__all__ = ['SpooledOutput', 'read_output']
+
+"""
+Commands output spooled to a temporary file instead of memory, when it's only needed
+for some results (ex: with --filter). The output is read only if the result is kept,
+otherwise the file is closed without being read.
+"""
+
+class SpooledOutput:
+    __slots__ = ('_file',)
+
+    def __init__(self, file) -> None:
+        self._file = file
+
+    def read(self) -> bytes:
+        try:
+            self._file.seek(0)
+            return self._file.read().strip()
+        finally:
+            self._file.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+def read_output(output) -> bytes:
+    if isinstance(output, SpooledOutput):
+        return output.read()
+
+    return output
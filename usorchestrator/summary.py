@@ -0,0 +1,77 @@
+import threading
+from usorchestrator.action_exec import ActionExec
+
+__all__ = ['Summary']
+
+"""
+Per host results counters, used instead of the actions output with --summary.
+
+Only the status of each result is kept, so sweeping a large fleet for failed hosts
+doesn't depend on the size of the actions output.
+"""
+
+class Summary:
+    def __init__(self) -> None:
+        # host: [ok, failed, skipped]
+        self._hosts: dict[str, list[int]] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, host: str, action_exec: ActionExec) -> None:
+        if not action_exec.passed_condition:
+            index = 2
+        elif action_exec.return_code != 0:
+            index = 1
+        else:
+            index = 0
+
+        with self._lock:
+            counters = self._hosts.setdefault(host, [0, 0, 0])
+            counters[index] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts = {}
+
+    def format(self, filters: list = None) -> str:
+        lines = []
+        totals = [0, 0, 0]
+
+        with self._lock:
+            hosts = sorted(self._hosts.items())
+
+        if not hosts:
+            return ''
+
+        width = max(len(host) for (host, _) in hosts)
+
+        for (host, counters) in hosts:
+            totals = [total + counter for (total, counter) in zip(totals, counters)]
+
+            if filters and not self._match_filters(filters, counters):
+                continue
+
+            (ok, failed, skipped) = counters
+            lines.append(f'{host:<{width}}  {ok:>6} ok  {failed:>6} failed  {skipped:>6} skipped')
+
+        (ok, failed, skipped) = totals
+        lines.append(f'{len(hosts)} hosts: {ok} ok, {failed} failed, {skipped} skipped')
+
+        return '\n'.join(lines) + '\n'
+
+    # hosts with at least one result matching any of the filters
+    def _match_filters(self, filters: list, counters: list[int]) -> bool:
+        (ok, failed, skipped) = counters
+
+        if 'exec_ok' in filters and ok:
+            return True
+
+        if 'exec_failed' in filters and failed:
+            return True
+
+        if 'condition_ok' in filters and (ok or failed):
+            return True
+
+        if 'condition_failed' in filters and skipped:
+            return True
+
+        return False